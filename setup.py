@@ -1,6 +1,6 @@
 #!/usr/bin/env python
 
-from distutils.core import setup
+from setuptools import setup
 
 setup(
     name='spec_diagnose',
@@ -10,6 +10,9 @@ setup(
     url="https://black-holes.org",
     packages=['spec_diagnose'],
     install_requires=['h5py', 'matplotlib', 'numpy', 'tqdm'],
+    entry_points={
+        'console_scripts': ['spec-diagnose=spec_diagnose.report:main'],
+    },
     classifiers=[
         "Programming Language :: Python :: 3",
         "License :: OSI Approved :: MIT License",
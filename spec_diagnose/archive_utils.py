@@ -0,0 +1,148 @@
+"""
+Compacted runs: all data of ImportRun in a single HDF5 file.
+
+Importing a run opens hundreds of small files in the segment
+directories.  CompactRun writes the result of ImportRun into one
+chunked, compressed HDF5 file, which ImportCompactRun (or ImportRun
+called with the name of that file) reads back with one file open.
+This is convenient for archived runs that are analyzed repeatedly,
+and for copying runs off a cluster.
+"""
+
+import json
+import h5py
+import numpy as np
+
+from collections.abc import Mapping
+
+import spec_diagnose.segment_utils as segment_utils
+from spec_diagnose.column_utils import LegendArrays
+
+FORMAT='spec_diagnose compacted run'
+VERSION=1
+
+
+def CompactRun(EvDir, Lev, out, verbosity=0, **kwargs):
+    """
+CompactRun(EvDir, Lev, out, **kwargs)
+
+Import a run with segment_utils.ImportRun, and write it to the HDF5 file 'out'.
+  EvDir, Lev -- Ev/ directory and Lev of the run
+  out        -- name of the HDF5 file to create (overwritten if present)
+  kwargs     -- further options of ImportRun, e.g. tmin, h22Finite, workers.
+                Not lazy or table: the file holds plain arrays, and is read
+                back as the dictionaries of the default import.
+
+Example:
+  CompactRun('/path/to/Ev', 2, 'Lev2.h5', h22Finite=True)
+  D=ImportRun('Lev2.h5', 2)
+"""
+    for option in 'lazy', 'table':
+        if kwargs.get(option, False):
+            raise ValueError("CompactRun cannot store an import with {}=True".format(option))
+    D=segment_utils.ImportRun(EvDir, Lev, verbosity=verbosity, **kwargs)
+    WriteCompactRun(D, out)
+    return D
+
+
+def WriteCompactRun(D, out):
+    """
+Write a dictionary returned by ImportRun into the HDF5 file 'out'.
+
+The segments, their start-times and termination reasons form the
+segment index at the root of the file.  Every data entry becomes a group.
+Legend dictionaries whose legends share one time column are stored as
+a single 2-d data-set 'table' with time in column 0, and the legends as
+column names.  Other entries are stored one data-set per array.
+"""
+    with h5py.File(out, 'w') as F:
+        F.attrs['format']=FORMAT
+        F.attrs['version']=VERSION
+        F.create_dataset('segs', data=np.array(D['segs'], dtype=h5py.string_dtype()))
+        F.create_dataset('tstart', data=np.array(D['tstart'], dtype=float))
+        F.create_dataset('termination',
+                         data=np.array(D['termination'], dtype=h5py.string_dtype()))
+        data={k: v for k,v in D.items()
+              if k not in ['segs', 'tstart', 'termination', 'ImportInfo']}
+        _WriteDict(F.create_group('data'), data)
+
+
+def ImportCompactRun(F):
+    """
+Read a file written by CompactRun, and return the same dictionary
+as ImportRun did when the run was compacted, without 'ImportInfo'.
+Since the segments are not read, it cannot be passed to RefreshRun.
+"""
+    with h5py.File(F, 'r') as H5:
+        if H5.attrs.get('format')!=FORMAT:
+            raise IOError("{} is not a compacted run".format(F))
+        D={'segs': [s.decode('utf-8') for s in H5['segs'][()]],
+           'tstart': [float(t) for t in H5['tstart'][()]],
+           'termination': [s.decode('utf-8') for s in H5['termination'][()]]}
+        D.update(_ReadDict(H5['data']))
+    return D
+
+
+def IsCompactRun(F):
+    """True if F is a file written by CompactRun"""
+    try:
+        with h5py.File(F, 'r') as H5:
+            return H5.attrs.get('format')==FORMAT
+    except OSError:
+        return False
+
+
+def _CreateDataset(group, name, data):
+    """chunked and compressed, unless empty"""
+    data=np.asarray(data)
+    if data.size==0:
+        return group.create_dataset(name, data=data)
+    return group.create_dataset(name, data=data, chunks=True,
+                                compression='gzip', compression_opts=4, shuffle=True)
+
+
+def _SharedTime(D):
+    """If all entries of D are (N,2) arrays with the same time column,
+return them as one 2-d array [time, value_1, value_2, ...], else None"""
+    values=list(D.values())
+    if len(values)==0 or any(isinstance(v, Mapping) for v in values):
+        return None
+    t=np.asarray(values[0])
+    if t.ndim!=2 or t.shape[1]!=2 or len(t)==0:
+        return None
+    t=t[:,0]
+    for v in values:
+        v=np.asarray(v)
+        if v.shape!=(len(t),2) or not np.array_equal(v[:,0], t):
+            return None
+    return np.column_stack([t]+[np.asarray(v)[:,1] for v in values])
+
+
+def _WriteDict(group, D):
+    # names may contain '/', so store them as attribute and
+    # enumerate the children
+    group.attrs['keys']=json.dumps(list(D.keys()))
+    table=_SharedTime(D)
+    if table is not None:
+        _CreateDataset(group, 'table', table)
+        return
+    for i,(k,v) in enumerate(D.items()):
+        if isinstance(v, Mapping):
+            _WriteDict(group.create_group(str(i)), v)
+        else:
+            _CreateDataset(group, str(i), v)
+
+
+def _ReadDict(group):
+    keys=json.loads(group.attrs['keys'])
+    if 'table' in group:
+        table=group['table'][()]
+        return dict(zip(keys, LegendArrays(table, range(1, len(keys)+1))))
+    D={}
+    for i,k in enumerate(keys):
+        obj=group[str(i)]
+        if isinstance(obj, h5py.Group):
+            D[k]=_ReadDict(obj)
+        else:
+            D[k]=obj[()]
+    return D
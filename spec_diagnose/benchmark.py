@@ -0,0 +1,207 @@
+"""
+Benchmarks of the loaders and plot functions on synthetic runs.
+
+  spec-diagnose benchmark -o bench.json
+  spec-diagnose benchmark --compare bench-old.json bench.json
+
+RunBenchmarks writes synthetic runs (see synthetic.MakeSyntheticRun) of
+increasing number of segments and file size, and times
+FindLatestSegments, each loader, ImportRun and the plot functions on
+them.  The results are stored as json, so that the timings of two
+versions of spec_diagnose can be compared with CompareBenchmarks.
+"""
+
+import os
+import json
+import time
+import platform
+import tempfile
+
+import h5py
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+
+import spec_diagnose.segment_utils as segment_utils
+import spec_diagnose.plot_utils as plot_utils
+import spec_diagnose.control_systems as control_systems
+import spec_diagnose.synthetic as synthetic
+
+FORMAT='spec_diagnose benchmark'
+
+
+def _Time(func, repeat):
+    """wall-times of 'repeat' calls of func()"""
+    times=[]
+    for i in range(repeat):
+        t0=time.perf_counter()
+        func()
+        times.append(time.perf_counter()-t0)
+        plt.close('all')
+    return times
+
+
+def _Bytes(EvDir):
+    """total size of the files of a run"""
+    size=0
+    for root,dirs,files in os.walk(EvDir):
+        for f in files:
+            size+=os.path.getsize(os.path.join(root, f))
+    return size
+
+
+def _LargeDat(EvDir, rows, columns=40):
+    """write a single .dat file with 'rows' rows and 'columns' columns
+next to the run EvDir (so it does not count into its size), return its name"""
+    F=os.path.join(os.path.dirname(os.path.abspath(EvDir)), 'Large.dat')
+    if not os.path.exists(F):
+        rng=np.random.default_rng(0)
+        synthetic._WriteDat(F, np.arange(rows, dtype=float),
+                            ['c{}'.format(k) for k in range(1, columns)],
+                            rng.random((rows, columns-1)))
+    return F
+
+
+def _Cases(EvDir, Lev):
+    """(name, function) of everything to be timed on one run"""
+    segs,tstart,term=segment_utils.FindLatestSegments(EvDir, Lev)
+    D=segment_utils.ImportRun(EvDir, Lev)
+    cases=[('FindLatestSegments', lambda: segment_utils.FindLatestSegments(EvDir, Lev))]
+    # one file as large as 10 runs, as for a long run without segments
+    large=_LargeDat(EvDir, 10*len(D['TStepperDiag']['dt']))
+    cases.append(('LoadDat_with_legend:Large.dat',
+                  lambda: segment_utils.LoadDat_with_legend(large)))
+    for F in ['ApparentHorizons/AhA.dat', 'ConstraintNorms/GhCe_Linf.dat',
+              'DiagAhSpeedA.dat', 'GrAdjustSubChunksToDampingTimes.dat']:
+        cases.append(('LoadDat_from_segments:'+F,
+                      lambda F=F: segment_utils.LoadDat_from_segments(segs, F)))
+    for F in ['ApparentHorizons/Horizons.h5', 'AdjustGridExtents.h5',
+              'GW2/rh_FiniteRadii_CodeUnits.h5']:
+        cases.append(('LoadH5_from_segments:'+F,
+                      lambda F=F: segment_utils.LoadH5_from_segments(segs, F)))
+    cases.append(('ImportRun', lambda: segment_utils.ImportRun(EvDir, Lev)))
+    cases.append(('ImportRun:h22Finite', lambda: segment_utils.ImportRun(EvDir, Lev, h22Finite=True)))
+    cases.append(('ImportRun:pipeline', lambda: segment_utils.ImportRun(EvDir, Lev, executor='pipeline')))
+
+    def Axes():
+        fig,ax=plt.subplots()
+        return ax
+    cases.append(('PlotControlSystems', lambda: control_systems.PlotControlSystems(D, 'A')))
+    cases.append(('PlotSubdomainConstraints',
+                  lambda: plot_utils.PlotSubdomainConstraints(Axes(), D['GhCeLinf'], N=5, Ngrey=20)))
+    cases.append(('PlotAH', lambda: plot_utils.PlotAH(Axes(), D['AhA'])))
+    cases.append(('PlotTruncationErrorSubdomain',
+                  lambda: plot_utils.PlotTruncationErrorSubdomain(Axes(), D['AdjustGrid'], 'SphereA0')))
+    return cases
+
+
+class BenchmarkError(RuntimeError):
+    """Raised by RunBenchmarks if cases failed; 'report' holds all results"""
+    def __init__(self, report, failed):
+        self.report=report
+        super().__init__("{} cases failed: {}".format(len(failed), ', '.join(
+            '{} ({} segs, {} rows)'.format(r['name'], r['segments'], r['rows'])
+            for r in failed)))
+
+
+def RunBenchmarks(segments=(5, 20), rows=(100, 1000), repeat=3, root=None,
+                  out=None, verbose=True, strict=True):
+    """
+RunBenchmarks(segments=(5, 20), rows=(100, 1000), repeat=3, root=None, out=None,
+              strict=True)
+
+Time the loaders and plot functions on synthetic runs, one for each
+combination of number of segments and rows per file.
+  repeat  -- number of timings of each case; the minimum is the
+             most reliable estimate
+  root    -- directory for the synthetic runs (default: a temporary directory)
+  out     -- if given, name of the json file for the results
+  strict  -- if True, raise BenchmarkError after all cases ran (and the
+             results were written) if any case failed.  The synthetic runs
+             are valid input, so a failure is a bug, not a timing.
+
+Returns the results: a dictionary with information about the system,
+and a list 'results' of dictionaries with the keys
+  name, segments, rows, bytes  -- case and size of the run
+  times, min, mean             -- wall-times in seconds
+  error                        -- the exception if the case failed, else None
+"""
+    matplotlib.use('Agg')
+    report={'format': FORMAT,
+            'date': time.strftime('%Y-%m-%d %H:%M:%S'),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'numpy': np.__version__,
+            'h5py': h5py.__version__,
+            'matplotlib': matplotlib.__version__,
+            'repeat': repeat,
+            'results': []}
+    with tempfile.TemporaryDirectory() as tmp:
+        if root is None:
+            root=tmp
+        for nseg in segments:
+            for nrows in rows:
+                EvDir=synthetic.MakeSyntheticRun(
+                    os.path.join(root, 'segs{}_rows{}'.format(nseg, nrows)),
+                    segments=nseg, rows=nrows)
+                size=_Bytes(EvDir)
+                for name,func in _Cases(EvDir, 2):
+                    result={'name': name, 'segments': nseg, 'rows': nrows,
+                            'bytes': size, 'times': [], 'min': None, 'mean': None,
+                            'error': None}
+                    try:
+                        result['times']=_Time(func, repeat)
+                        result['min']=min(result['times'])
+                        result['mean']=sum(result['times'])/repeat
+                    except Exception as e:
+                        result['error']='{}: {}'.format(type(e).__name__, e)
+                        plt.close('all')
+                    report['results'].append(result)
+                    if verbose:
+                        print(_Format(result), flush=True)
+    if out is not None:
+        with open(out, 'w') as f:
+            json.dump(report, f, indent=1)
+    failed=[result for result in report['results'] if result['error'] is not None]
+    if strict and failed:
+        raise BenchmarkError(report, failed)
+    return report
+
+
+def _Format(result):
+    if result['error'] is not None:
+        timing='FAILED {}'.format(result['error'])
+    else:
+        timing='{:9.4f}s'.format(result['min'])
+    return '{:>4} segs {:>6} rows  {:<50} {}'.format(
+        result['segments'], result['rows'], result['name'], timing)
+
+
+def CompareBenchmarks(old, new):
+    """
+CompareBenchmarks(old, new)
+
+Print the minimal times of the results of two RunBenchmarks (or the
+names of their json files), and their ratio new/old.
+Returns a list of (name, segments, rows, old time, new time, ratio).
+"""
+    reports=[]
+    for report in old, new:
+        if not isinstance(report, dict):
+            with open(report) as f:
+                report=json.load(f)
+        if report.get('format')!=FORMAT:
+            raise ValueError("not a benchmark report")
+        reports.append({(r['name'], r['segments'], r['rows']): r['min']
+                        for r in report['results']})
+    out=[]
+    for key,t_new in reports[1].items():
+        t_old=reports[0].get(key)
+        ratio=None if t_old is None or t_new is None else t_new/t_old
+        out.append(key+(t_old, t_new, ratio))
+        print('{:>4} segs {:>6} rows  {:<50} {:>10} {:>10} {:>7}'.format(
+            key[1], key[2], key[0],
+            '-' if t_old is None else '{:.4f}s'.format(t_old),
+            '-' if t_new is None else '{:.4f}s'.format(t_new),
+            '-' if ratio is None else '{:.2f}'.format(ratio)))
+    return out
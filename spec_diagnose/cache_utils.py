@@ -0,0 +1,179 @@
+"""
+On-disk cache for parsed segment files.
+
+Finished segments never change, so re-parsing their .dat and .h5 files
+on every ImportRun is wasted work.  SegmentCache stores the parsed arrays
+of each file as an .npz file, keyed by the path of the file and validated
+against its modification time and size.  Files that are still growing
+(the ongoing segment) fail this check and are re-read.
+
+Small json-serializable indices, like the start-times of terminated
+segments collected by FindLatestSegments, are kept in the same directory.
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+
+
+class SegmentCache:
+    """
+SegmentCache(directory=None, max_bytes=4*2**30)
+
+Cache of parsed segment files.
+  directory -- where to store the cache, default $SPEC_DIAGNOSE_CACHE
+               or ~/.cache/spec_diagnose
+  max_bytes -- total size of the cache.  When exceeded, the least
+               recently used entries are deleted.
+
+A cache entry is a (possibly nested) dictionary of np.arrays, as
+returned by segment_utils.LoadDat_with_legend or segment_utils.LoadH5.
+
+Example:
+  cache=SegmentCache('/scratch/me/spec_cache')
+  D=ImportRun(path_to_ev, 2, cache=cache)
+"""
+
+    def __init__(self, directory=None, max_bytes=4*2**30):
+        if directory is None:
+            directory=os.environ.get('SPEC_DIAGNOSE_CACHE',
+                                     os.path.join(os.path.expanduser('~'),
+                                                  '.cache', 'spec_diagnose'))
+        self.directory=directory
+        self.max_bytes=max_bytes
+        self._written=0   # bytes written since the last eviction
+        os.makedirs(directory, exist_ok=True)
+
+    def _entry(self, F, tag):
+        """name of the cache entry for file F loaded with options 'tag'"""
+        key=os.path.abspath(F)+'\0'+tag
+        return os.path.join(self.directory,
+                            hashlib.sha1(key.encode('utf-8')).hexdigest()+'.npz')
+
+    @staticmethod
+    def _signature(F):
+        st=os.stat(F)
+        return [st.st_mtime_ns, st.st_size]
+
+    def get(self, F, tag=''):
+        """Return the cached dictionary for file F, or None if there is
+no entry or F has changed since it was stored"""
+        entry=self._entry(F, tag)
+        try:
+            with np.load(entry, allow_pickle=False) as npz:
+                meta=json.loads(str(npz['__meta__']))
+                if meta['signature']!=self._signature(F):
+                    return None
+                arrays=[npz['arr_{}'.format(i)] for i in range(meta['n_arrays'])]
+        except (OSError, KeyError, ValueError):
+            return None
+        try:
+            os.utime(entry)   # mark as recently used
+        except OSError:
+            pass
+        return _Unflatten(meta['tree'], arrays)
+
+    def put(self, F, D, tag='', signature=None):
+        """Store the dictionary D as parsed content of file F.
+signature -- (mtime, size) of F at the time it was read.  If F changed
+             since then, nothing is stored."""
+        current=self._signature(F)
+        if signature is not None and list(signature)!=current:
+            return
+        arrays=[]
+        tree=_Flatten(D, arrays)
+        meta=json.dumps({'signature': current, 'n_arrays': len(arrays), 'tree': tree})
+        entry=self._entry(F, tag)
+        tmp='{}.{}.tmp.npz'.format(entry[:-4], os.getpid())
+        np.savez(tmp, __meta__=np.array(meta),
+                 **{'arr_{}'.format(i): a for i,a in enumerate(arrays)})
+        os.replace(tmp, entry)   # atomic, concurrent readers see old or new entry
+        self._written+=os.path.getsize(entry)
+        if self._written>self.max_bytes/10:
+            self.evict()
+
+    def load(self, F, loader, tag=''):
+        """Return loader(F), taking it from the cache if possible"""
+        D=self.get(F, tag)
+        if D is None:
+            signature=self._signature(F)
+            D=loader(F)
+            self.put(F, D, tag, signature=signature)
+        return D
+
+    def _index(self, name):
+        return os.path.join(self.directory,
+                            hashlib.sha1(name.encode('utf-8')).hexdigest()+'.json')
+
+    def get_index(self, name):
+        """Return the json-serializable object stored with put_index
+under 'name', or None"""
+        try:
+            with open(self._index(name)) as f:
+                index=json.load(f)
+        except (OSError, ValueError):
+            return None
+        try:
+            os.utime(self._index(name))   # mark as recently used
+        except OSError:
+            pass
+        return index
+
+    def put_index(self, name, index):
+        """Store the json-serializable object 'index' under 'name'"""
+        entry=self._index(name)
+        tmp='{}.{}.tmp'.format(entry, os.getpid())
+        with open(tmp, 'w') as f:
+            json.dump(index, f)
+        os.replace(tmp, entry)
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits into max_bytes"""
+        self._written=0
+        entries=[]
+        for name in os.listdir(self.directory):
+            if not (name.endswith('.npz') or name.endswith('.json')) \
+               or name.endswith('.tmp.npz'):
+                continue
+            try:
+                st=os.stat(os.path.join(self.directory, name))
+            except OSError:
+                continue   # removed concurrently
+            entries.append((st.st_mtime, st.st_size, name))
+        total=sum(size for mtime,size,name in entries)
+        for mtime,size,name in sorted(entries):
+            if total<=self.max_bytes:
+                break
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+            total-=size
+
+
+def GetCache(cache):
+    """Turn the 'cache' option of the loaders into a SegmentCache (or None).
+cache may be None, a directory name, or a SegmentCache"""
+    if cache is None or isinstance(cache, SegmentCache):
+        return cache
+    return SegmentCache(cache)
+
+
+def _Flatten(D, arrays):
+    """Replace every array in the recursive dictionary D by its index
+into 'arrays', to be stored as json"""
+    tree={}
+    for k,v in D.items():
+        if isinstance(v, dict):
+            tree[k]=_Flatten(v, arrays)
+        else:
+            tree[k]=len(arrays)
+            arrays.append(v)
+    return tree
+
+
+def _Unflatten(tree, arrays):
+    """Inverse of _Flatten"""
+    return {k: _Unflatten(v, arrays) if isinstance(v, dict) else arrays[v]
+            for k,v in tree.items()}
@@ -0,0 +1,314 @@
+"""
+Containers for columns of time-series data.
+"""
+
+import numpy as np
+
+from collections.abc import Mapping
+
+
+def StitchCutoffs(first):
+    """
+StitchCutoffs(first)
+
+For consecutive pieces of a time series starting at the times 'first'
+(inf for empty pieces), the time from which on the data of each piece
+is superseded by a later piece: the earliest start of all later pieces.
+"""
+    first=np.asarray(first, dtype=float)
+    if len(first)==0:
+        return first
+    return np.append(np.minimum.accumulate(first[::-1])[::-1][1:], np.inf)
+
+
+def StitchRows(times):
+    """
+StitchRows(times)
+
+Stitch consecutive pieces of a time series, e.g. the data of consecutive
+segments, where a segment restarted from a checkpoint overlaps the end
+of the previous ones.  The newer data is kept: of each piece, only the
+rows before the first time of all later pieces are kept.  If every piece
+is increasing in time, the stitched series is strictly increasing.
+
+  times -- list of the 1-d time arrays of the pieces
+
+Returns the list of the number of leading rows to keep of each piece.
+"""
+    cutoff=StitchCutoffs([t[0] if len(t)>0 else np.inf for t in times])
+    return [int(np.searchsorted(t, c, side='left')) for t,c in zip(times, cutoff)]
+
+
+class ColumnBuffer:
+    """
+ColumnBuffer(pieces=())
+
+Accumulate the pieces of an array (e.g. the data of consecutive
+segments) along its first axis.  The pieces are joined only when the
+array is requested, so building an array out of n pieces costs a single
+copy instead of the O(n^2) copying of repeated np.concatenate.
+
+Example:
+  buf=ColumnBuffer()
+  for seg in segments:
+      buf.append(LoadSomething(seg))
+  data=buf.array()
+"""
+
+    def __init__(self, pieces=()):
+        self._pieces=list(pieces)
+
+    def append(self, piece):
+        """Add piece at the end"""
+        self._pieces.append(piece)
+
+    def __len__(self):
+        return sum(len(piece) for piece in self._pieces)
+
+    @property
+    def nbytes(self):
+        """bytes of all pieces"""
+        return sum(piece.nbytes for piece in self._pieces)
+
+    def stitch(self):
+        """Drop rows overlapping later pieces, see StitchRows.  Time is
+column 0 of the pieces; pieces that are not 2-d are left alone."""
+        if any(piece.ndim!=2 or piece.shape[1]==0 for piece in self._pieces):
+            return
+        keep=StitchRows([piece[:,0] for piece in self._pieces])
+        self._pieces=[piece[:n] for piece,n in zip(self._pieces, keep)]
+
+    def array(self):
+        """Return all pieces as a single array.  A single piece is
+returned as is, without copying."""
+        if len(self._pieces)==0:
+            return None
+        if len(self._pieces)>1:
+            self._pieces=[np.concatenate(self._pieces)]
+        return self._pieces[0]
+
+
+def LegendView(data, column):
+    """
+Return the (N,2) array [time, value] of one column of the 2-d array
+'data' (time in column 0), as a read-only view without copying.
+"""
+    if not 0<=column<data.shape[1]:
+        raise IndexError("column {} out of range for data with {} columns".format(column, data.shape[1]))
+    return np.lib.stride_tricks.as_strided(
+        data, shape=(data.shape[0], 2),
+        strides=(data.strides[0], column*data.strides[1]),
+        writeable=False)
+
+
+def LegendArrays(data, columns):
+    """
+LegendArrays(data, columns)
+
+List of (N,2) arrays [time, value], one for each of the 'columns' of
+the 2-d array 'data' (time in column 0).  Unlike LegendView, the arrays
+are writable and independent of 'data' and of each other, but they are
+made with a single allocation and one vectorized copy.
+"""
+    out=np.empty((len(columns), data.shape[0], 2), dtype=data.dtype)
+    out[:,:,0]=data[:,0]
+    out[:,:,1]=data[:,list(columns)].T
+    return list(out)
+
+
+class LegendColumns:
+    """
+LegendColumns(legends=None, data=None)
+
+Accumulate 2-d blocks of data with time in column 0, whose columns are
+named by a legend (dictionary legend -> 0-based column index), e.g.
+the content of a .dat file in consecutive segments.
+
+dict() returns the usual dictionary of (N,2) arrays, one per legend.
+Consecutive blocks with the same legend are joined into one block, from
+which all its legends are made in one pass (see LegendArrays).  With
+dict(views=True), each legend is a read-only view into the block
+instead, so the time column is stored only once.
+"""
+
+    def __init__(self, legends=None, data=None):
+        self._groups=[]   # list of [legends, ColumnBuffer]
+        if data is not None:
+            self.append(legends, data)
+
+    def append(self, legends, data):
+        """Add block 'data' with columns named by 'legends' at the end"""
+        if len(self._groups)>0 and self._groups[-1][0]==legends:
+            self._groups[-1][1].append(data)
+        else:
+            self._groups.append([legends, ColumnBuffer([data])])
+
+    def extend(self, other):
+        """Add all blocks of the LegendColumns 'other' at the end"""
+        for legends, buf in other._groups:
+            for data in buf._pieces:
+                self.append(legends, data)
+
+    def __len__(self):
+        """number of rows of all blocks"""
+        return sum(len(buf) for legends, buf in self._groups)
+
+    @property
+    def nbytes(self):
+        """bytes of all blocks"""
+        return sum(buf.nbytes for legends, buf in self._groups)
+
+    def stitch(self):
+        """Drop rows overlapping later blocks, see StitchRows"""
+        pieces=[piece for legends, buf in self._groups for piece in buf._pieces]
+        keep=iter(StitchRows([piece[:,0] for piece in pieces]))
+        for legends, buf in self._groups:
+            buf._pieces=[piece[:next(keep)] for piece in buf._pieces]
+
+    def rows(self):
+        """dictionary legend -> number of rows"""
+        out={}
+        for legends, buf in self._groups:
+            for legend in legends:
+                out[legend]=out.get(legend, 0)+len(buf)
+        return out
+
+    def dict(self, views=False):
+        """dictionary legend -> (N,2) array [time, value].
+views -- if False, the arrays are writable and independent of each other.
+         If True, they are read-only views into the joined blocks, see LegendView."""
+        out={}
+        for legends, buf in self._groups:
+            data=buf.array()
+            if views:
+                arrays=[LegendView(data, column) for column in legends.values()]
+            else:
+                arrays=LegendArrays(data, legends.values())
+            for legend, array in zip(legends, arrays):
+                if legend not in out:
+                    out[legend]=ColumnBuffer()
+                out[legend].append(array)
+        return {legend: buf.array() for legend, buf in out.items()}
+
+
+class RunTable(Mapping):
+    """
+RunTable(time, names, data, present=None)
+
+Columnar table of the data of one .dat file: a single time index shared
+by all columns, and the values as 2-d float64 array with contiguous
+columns.  Rows where a column was not written (e.g. a subdomain that
+does not exist in some segments of GhCe_Linf.dat) are NaN and marked as
+absent in 'present'.
+
+  time    -- 1-d array, N rows
+  names   -- list of the column names (the legends)
+  data    -- (N, len(names)) array of the values
+  present -- (N, len(names)) bool array, or None if all values are present
+
+As a Mapping, a RunTable behaves like the legacy dictionary of
+LoadDat_from_segments: table[legend] is the (n,2) array [time, value]
+of the rows where legend is present, see to_dict().  Operations on many
+columns work on the table directly:
+
+  table.columns(['SphereA0', 'SphereA1'])  -> (N,2) array of values
+  table.column('SphereA0')                 -> 1-d view
+  table.window(100, 200)                   -> RunTable of 100<=t<=200 (views)
+"""
+
+    def __init__(self, time, names, data, present=None):
+        self.time=np.asarray(time, dtype=float)
+        self.names=list(names)
+        self.data=np.asarray(data, dtype=float)
+        if present is not None and present.all():
+            present=None
+        self.present=present
+        self._index={name: i for i,name in enumerate(self.names)}
+
+    @classmethod
+    def from_legend_columns(cls, data):
+        """RunTable of the blocks of the LegendColumns 'data' (time in column 0)"""
+        blocks=[]
+        for legends, buf in data._groups:
+            block=buf.array()
+            blocks.append((block[:,0], list(legends), block[:,list(legends.values())], None))
+        return cls._FromBlocks(blocks)
+
+    @classmethod
+    def concatenate(cls, tables, stitch=False):
+        """One RunTable with the rows of all 'tables', one after the other.
+stitch -- if True, drop rows overlapping later tables, see StitchRows"""
+        if stitch:
+            keep=StitchRows([t.time for t in tables])
+            tables=[RunTable(t.time[:n], t.names, t.data[:n],
+                             None if t.present is None else t.present[:n])
+                    for t,n in zip(tables, keep)]
+        return cls._FromBlocks([(t.time, t.names, t.data, t.present) for t in tables])
+
+    @classmethod
+    def _FromBlocks(cls, blocks):
+        """blocks -- list of (time, names, values, present)"""
+        names=list(dict.fromkeys(name for time, block_names, values, present in blocks
+                                 for name in block_names))
+        index={name: i for i,name in enumerate(names)}
+        N=sum(len(time) for time, block_names, values, present in blocks)
+        time=np.empty(N)
+        # Fortran order, so that each column is contiguous
+        values=np.empty((N, len(names)), order='F')
+        complete=all(present is None and len(block_names)==len(names)
+                     for time_, block_names, values_, present in blocks)
+        allpresent=None
+        if not complete:
+            values.fill(np.nan)
+            allpresent=np.zeros((N, len(names)), dtype=bool, order='F')
+        row=0
+        for block_time, block_names, block_values, present in blocks:
+            n=len(block_time)
+            idx=[index[name] for name in block_names]
+            time[row:row+n]=block_time
+            values[row:row+n, idx]=block_values
+            if allpresent is not None:
+                allpresent[row:row+n, idx]=True if present is None else present
+            row+=n
+        return cls(time, names, values, allpresent)
+
+    def __getitem__(self, name):
+        j=self._index[name]
+        if self.present is None:
+            return np.column_stack([self.time, self.data[:,j]])
+        mask=self.present[:,j]
+        return np.column_stack([self.time[mask], self.data[mask,j]])
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __len__(self):
+        return len(self.names)
+
+    def __contains__(self, name):
+        return name in self._index
+
+    @property
+    def rows(self):
+        """number of rows"""
+        return len(self.time)
+
+    def column(self, name):
+        """values of column 'name' (NaN where absent), as 1-d view"""
+        return self.data[:,self._index[name]]
+
+    def columns(self, names):
+        """values of the columns 'names' (NaN where absent), as (N, len(names)) array"""
+        return self.data[:,[self._index[name] for name in names]]
+
+    def window(self, tmin=-np.inf, tmax=np.inf):
+        """RunTable of the rows with tmin <= time <= tmax, as views into this
+table.  The time index has to be sorted."""
+        i=np.searchsorted(self.time, tmin, side='left')
+        j=np.searchsorted(self.time, tmax, side='right')
+        return RunTable(self.time[i:j], self.names, self.data[i:j],
+                        None if self.present is None else self.present[i:j])
+
+    def to_dict(self):
+        """the legacy dictionary legend -> (n,2) array [time, value]"""
+        return {name: self[name] for name in self.names}
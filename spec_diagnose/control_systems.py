@@ -1,6 +1,10 @@
+import weakref
 import matplotlib.pyplot as plt
 import numpy as np
 
+from matplotlib.collections import Collection
+from matplotlib.lines import Line2D
+
 import spec_diagnose.plot_utils as plot_utils
 
 # from https://gist.github.com/thomasaarholt/c8440b132aaea9f71f0588af486ad457
@@ -13,27 +17,25 @@ def autoscale(ax=None, axis='y', margin=0.1):
     with margins in fraction of the width of the plot
 
     Defaults to current axes object if not specified.
+
+    The data of each artist is indexed once (see RangeIndex), so
+    repeated calls after changing the limits take O(log n) per artist.
     '''
-    import matplotlib.pyplot as plt
-    import numpy as np
     if ax is None:
         ax = plt.gca()
     newlow, newhigh = np.inf, -np.inf
 
-    for artist in ax.collections + ax.lines:
-        x,y = get_xy(artist)
-        if axis == 'y':
-            setlim = ax.set_ylim
-            lim = ax.get_xlim()
-            scale = ax.get_yscale()
-            fixed, dependent = x, y
-        else:
-            setlim = ax.set_xlim
-            lim = ax.get_ylim()
-            scale = ax.get_xscale()
-            fixed, dependent = y, x
+    if axis == 'y':
+        setlim = ax.set_ylim
+        lim = ax.get_xlim()
+        scale = ax.get_yscale()
+    else:
+        setlim = ax.set_xlim
+        lim = ax.get_ylim()
+        scale = ax.get_xscale()
 
-        low, high = calculate_new_limit(fixed, dependent, lim)
+    for artist in list(ax.collections) + list(ax.lines):
+        low, high = _ArtistIndex(artist, axis).limits(lim)
         newlow = low if low < newlow else newlow
         newhigh = high if high > newhigh else newhigh
 
@@ -81,15 +83,103 @@ def calculate_new_limit(fixed, dependent, limit):
 def get_xy(artist):
     '''Gets the xy coordinates of a given artist
     '''
-    if "Collection" in str(artist):
+    if isinstance(artist, Collection):
         x, y = artist.get_offsets().T
-    elif "Line" in str(artist):
+    elif isinstance(artist, Line2D):
         x, y = artist.get_xdata(), artist.get_ydata()
     else:
         raise ValueError("This type of object isn't implemented yet")
     return x, y
 
 
+class RangeIndex:
+    '''RangeIndex(fixed, dependent)
+
+    min/max of 'dependent' over the points with limit[0]<fixed<limit[1],
+    for many different limits.  The points are sorted by 'fixed' once, so
+    the window is found with searchsorted.  The minima and maxima of
+    blocks of BLOCK points are stored in a sparse table, so the range
+    min/max costs O(1) array operations, with O(n/BLOCK log n) memory.
+
+    limits(limit) returns the same as calculate_new_limit(fixed, dependent, limit)
+    '''
+    BLOCK=64
+
+    def __init__(self, fixed, dependent):
+        fixed=np.asarray(fixed, dtype=float)
+        dependent=np.asarray(dependent, dtype=float)
+        if len(fixed)<=2:
+            self._small=(fixed, dependent)
+            return
+        self._small=None
+        order=np.argsort(fixed, kind='stable')
+        self._fixed=fixed[order]
+        self._dep=dependent[order]
+        self._all=(dependent.min(), dependent.max())
+        # sparse table over blocks: level k covers 2**k blocks
+        nblocks=-(-len(self._dep)//self.BLOCK)
+        pad=nblocks*self.BLOCK-len(self._dep)
+        blocks=np.concatenate([self._dep, np.repeat(self._dep[-1:], pad)]).reshape(nblocks, self.BLOCK)
+        self._min=[blocks.min(axis=1)]
+        self._max=[blocks.max(axis=1)]
+        k=1
+        while 2**k<=nblocks:
+            h=2**(k-1)
+            self._min.append(np.minimum(self._min[-1][:-h], self._min[-1][h:]))
+            self._max.append(np.maximum(self._max[-1][:-h], self._max[-1][h:]))
+            k+=1
+
+    def limits(self, limit):
+        if self._small is not None:
+            return calculate_new_limit(*self._small, limit)
+        # points with limit[0] < fixed < limit[1]; NaN sort last and are excluded
+        i=int(np.searchsorted(self._fixed, limit[0], side='right'))
+        j=int(np.searchsorted(self._fixed, limit[1], side='left'))
+        if j<=i:
+            return self._all # no data in plot - use all data for range
+        B=self.BLOCK
+        bi=-(-i//B)  # first full block
+        bj=j//B      # end of full blocks
+        if bj<=bi:
+            window=self._dep[i:j]
+            return window.min(), window.max()
+        low=[self._min_range(bi, bj)]
+        high=[self._max_range(bi, bj)]
+        for a,b in (i,bi*B), (bj*B,j):
+            if b>a:
+                low.append(self._dep[a:b].min())
+                high.append(self._dep[a:b].max())
+        return np.min(low), np.max(high)
+
+    def _min_range(self, a, b):
+        k=(b-a).bit_length()-1
+        return np.minimum(self._min[k][a], self._min[k][b-2**k])
+
+    def _max_range(self, a, b):
+        k=(b-a).bit_length()-1
+        return np.maximum(self._max[k][a], self._max[k][b-2**k])
+
+
+_index_cache=weakref.WeakKeyDictionary()
+
+def _ArtistIndex(artist, axis):
+    '''RangeIndex of the data of 'artist', cached until its data changes'''
+    # the arrays holding the data, replaced by set_data/set_offsets
+    if isinstance(artist, Collection):
+        data=[artist.get_offsets()]
+    else:
+        data=[artist.get_xdata(), artist.get_ydata()]
+    entry=_index_cache.setdefault(artist, {})
+    if axis in entry:
+        old,index=entry[axis]
+        if all(a is b for a,b in zip(old, data)):
+            return index
+    x,y = get_xy(artist)
+    index=RangeIndex(x, y) if axis=='y' else RangeIndex(y, x)
+    entry[axis]=(data, index)
+    return index
+
+
 # if __name__ == "__main__":
 #     # To test
 #     fig, axes = plt.subplots(ncols = 4, figsize=(12,3))
@@ -119,32 +209,59 @@ def get_xy(artist):
 
 
 ################################################################
-def PlotControlSystems(D, AH, tref=0., xlim=None, PrintTerminationReason=False):
+def PlotControlSystems(D, AH, tref=0., xlim=None, PrintTerminationReason=False,
+                       max_points=None):
     """
     Plots various diagnostics to diagnose IncomingCharFields errors.
     D -- dictionary returned form segment_utils.ImportRun()
     AH -- one of 'A', 'B'   The AH to consider
     tref -- use t-tref as x-axis.  Useful for very zoomed in time-regions late in a run
     xlim -- if given is used in call to set_xlim(xlim) to set time-axis
+    max_points -- decimate each curve to about max_points points, keeping
+                  full resolution inside xlim where possible (see plot_utils.Decimate)
 
 
     ActivationState documented at https://github.com/sxs-collaboration/spec/blob/6e02cd7347cd34b013ebf2f0fcfe9fe85bf9acf5/Evolution/FoshSystem/DualFrameSystem/MeasureControlAhSpeed.hpp#L29
     Many other quantitites are explained at https://arxiv.org/abs/1412.1803
+
+    Returns the ControlSystemsDashboard holding the figures, which can
+    be redrawn with new data of the run, see ControlSystemsDashboard.update
     """
+    return ControlSystemsDashboard(D, AH, tref=tref, xlim=xlim,
+                                   PrintTerminationReason=PrintTerminationReason,
+                                   max_points=max_points)
 
-    if tref<0:
-        # set tref to be the end of the data
-        tref = int(D['TStepperDiag']['dt'][-1,0])
-    if tref==0:
-        xaxis_label="t"
-    else:
-        xaxis_label=f"$t - {tref}$"
+
+def _PanelMap(Panels):
+    """dictionary key -> indices of the panels containing key"""
+    out={}
+    for idx,panel in enumerate(Panels):
+        for k in panel:
+            out.setdefault(k, []).append(idx)
+    return out
 
 
+class ControlSystemsDashboard:
+    """
+    ControlSystemsDashboard(D, AH, tref=0., xlim=None, PrintTerminationReason=False,
+                            max_points=None)
+
+    The figures of PlotControlSystems (same arguments), kept for redrawing.
+    The figures, axes and lines are created once.  update(D) replaces the
+    data of the lines with set_data, which is much faster than creating the
+    figures again, and removes the lines of data no longer in D, e.g. for
+    monitoring a running simulation:
+
+      dash=ControlSystemsDashboard(D, 'A', xlim=[-200,0], tref=-1)
+      while True:
+          time.sleep(60)
+          segment_utils.RefreshRun(D)
+          dash.update(D)
+
+    tref<0 is resolved to the end of the data when the dashboard is created.
+    """
+
     # TOP PANELS - DIAG-AH
-    fig0 = plt.figure(figsize=[32,3.5])
-    diagAH=D['DiagAhSpeed'+AH]
-    #print(f"len(diagAH)={len(diagAH['time'][:,0])}")
     Panels0=[['TargetCharSpeed','Qa'],
             ['CharSpeed','ComovingMinCharSpeed','TargetCharSpeed','Qa'],
             ['CharSpeed','Q'],
@@ -154,31 +271,7 @@ def PlotControlSystems(D, AH, tref=0., xlim=None, PrintTerminationReason=False):
             ['DtLambdaAH','DtLambda'],
             ['LambdaAH','Lambda'],
         ]
-    columns=len(Panels0)
-    axs0=[fig0.add_subplot(1, columns, i+1) for i in range(columns) ]
-    for k in diagAH.keys():
-        found=False
-        if k=='time': continue
-        d=diagAH[k]
-        t=d[:,0]-tref
-        for idx,panel in enumerate(Panels0):
-            if k in panel:
-                axs0[idx].plot(t,d[:,1], label=k)
-                found=True
-                if idx==0 and k=='Q':
-                    axs0[idx].plot(t,d[:,1],'o')
-            if 'ActivationState' in panel:
-                # this panel plots an activaton state,
-                # so, add explanation of it
-                axs0[idx].set_title("1=2CharSpeedTarget 2=VelocityTarget 3=Velocity+drift", fontsize='x-small')
-
-        if not found: # plot in first panel
-            axs0[0].plot(t,d[:,1], label=k)
-    axs0[0].set_title('DiagAhSpeed'+AH)
-
-
     # MIDDLE PANELS - AH
-    fig1 = plt.figure(figsize=[32,3.5])
     ignore1=['Area']
     Panels1=[[],
              ['NumIterations', 'convg reason'],
@@ -190,35 +283,7 @@ def PlotControlSystems(D, AH, tref=0., xlim=None, PrintTerminationReason=False):
              ['Center_y', 'Center_z'],
 
     ]
-    columns=len(Panels1)
-    axs1=[fig1.add_subplot(1, columns, i+1) for i in range(columns) ]
-    for k in D['Ah'+AH].keys():
-        found=False
-        if k=='time' or k in ignore1: continue
-        d=D['Ah'+AH][k]
-        t=d[:,0]-tref
-        for idx,panel in enumerate(Panels1):
-            if k in panel:
-                if k=='NumIterations':
-                    axs1[idx].plot(t,d[:,1], '.', label=k)
-                else:
-                    axs1[idx].plot(t,d[:,1], label=k)
-
-                found=True
-        if not found: # plot in first panel
-            axs1[0].plot(t,d[:,1], label=k)
-    axs1[0].set_title('Ah'+AH)
-
-
-
     # BOTTOM PANELS - OTHER THINGS
-
-    fig2 = plt.figure(figsize=[32,3.5])
-    columns=8
-    axs2=[fig2.add_subplot(1, columns, i+1) for i in range(columns) ]
-    axs2[0].set_title('Diverse diagnostics')
-
-
     Panels2=[
             ['TargetChunkSize', 'ActualChunkSize'], #, 'SubChunksPerChunk'],
         ['Tdamp(LambdaFactorA)', 'Tdamp(LambdaFactorA0)',
@@ -227,79 +292,145 @@ def PlotControlSystems(D, AH, tref=0., xlim=None, PrintTerminationReason=False):
          'Tdamp(SkewAngle)', 'Tdamp(Trans)'],
         ['Tdamp(SmoothCoordSep)', 'Tdamp(SmoothMinDeltaRNoLam00AhA)', 'Tdamp(SmoothMinDeltaRNoLam00AhB)', 'Tdamp(SmoothRAhA)', 'Tdamp(SmoothRAhB)'],
     ]
+    _map0=_PanelMap(Panels0)
+    _map1=_PanelMap(Panels1)
+
+    def __init__(self, D, AH, tref=0., xlim=None, PrintTerminationReason=False,
+                 max_points=None):
+        if tref<0:
+            # set tref to be the end of the data
+            tref = int(D['TStepperDiag']['dt'][-1,0])
+        self.AH=AH
+        self.tref=tref
+        self.xlim=xlim
+        self.PrintTerminationReason=PrintTerminationReason
+        self.max_points=max_points
+        if tref==0:
+            self.xaxis_label="t"
+        else:
+            self.xaxis_label=f"$t - {tref}$"
+
+        self.figures=[plt.figure(figsize=[32,3.5]) for i in range(3)]
+        columns=[len(self.Panels0), len(self.Panels1), 8]
+        self.axes=[[fig.add_subplot(1, n, i+1) for i in range(n)]
+                   for fig,n in zip(self.figures, columns)]
+        axs0,axs1,axs2=self.axes
+        axs0[0].set_title('DiagAhSpeed'+AH)
+        # the ActivationState panel gets an explanation of it
+        for idx in self._map0['ActivationState']:
+            axs0[idx].set_title("1=2CharSpeedTarget 2=VelocityTarget 3=Velocity+drift", fontsize='x-small')
+        axs1[0].set_title('Ah'+AH)
+        axs2[0].set_title('Diverse diagnostics')
+        axs2[7].set_title("ForContinuation/AhC")  # always write title
+        for idx in 1,2,3,6:
+            axs2[idx].set_yscale('log')
+
+        self._lines={}        # (panel, name) -> Line2D
+        self._annotations=[]  # artists added by AnnotateSegments
+        self.update(D)
+
+    def _plot(self, ax, name, d, *args, **kwargs):
+        """plot the (N,2) array d into ax, or replace the data of the
+        line plotted there before under 'name'"""
+        t=d[:,0]-self.tref
+        self._current.add((id(ax), name))
+        line=self._lines.get((id(ax), name))
+        if line is None:
+            self._lines[(id(ax), name)],=plot_utils.PlotDecimated(
+                ax, t, d[:,1], *args, max_points=self.max_points, xlim=self.xlim, **kwargs)
+        else:
+            line.set_data(*plot_utils.Decimate(t, d[:,1], self.max_points, self.xlim))
+
+    def _annotate(self, ax, **kwargs):
+        before=set(ax.lines)|set(ax.texts)
+        plot_utils.AnnotateSegments(ax, self._D, tref=self.tref, font_size=10, **kwargs)
+        self._annotations.extend(a for a in list(ax.lines)+list(ax.texts) if a not in before)
+
+    def update(self, D):
+        """Redraw the figures with the data of the run D"""
+        self._D=D
+        AH=self.AH
+        axs0,axs1,axs2=self.axes
+        for artist in self._annotations:
+            artist.remove()
+        self._annotations=[]
+        self._current=set()   # keys of self._lines plotted by this update
+
+        diagAH=D['DiagAhSpeed'+AH]
+        for k in diagAH.keys():
+            if k=='time': continue
+            d=diagAH[k]
+            for idx in self._map0.get(k, [0]): # not found: plot in first panel
+                self._plot(axs0[idx], k, d, label=k)
+                if idx==0 and k=='Q':
+                    self._plot(axs0[idx], k+' markers', d, 'o')
 
-    for idx,panel in enumerate(Panels2):
-        for k in panel:
-            d=D['GrAdjustSubChunksToDampingTimes'][k]
-            t=d[:,0]-tref
-            axs2[idx].plot(t,d[:,1],label=k)
-    axs2[1].set_yscale('log')
-    axs2[2].set_yscale('log')
-    axs2[3].set_yscale('log')
-
-
-    # AdjustGridExtents
-    sphere=AH
-    if AH=='C': sphere='D' # innermost spheres in ringdown are SphereD*
-    for k in 'Sphere'+sphere+'0', 'Sphere'+sphere+'1', 'Sphere'+sphere+'2':
-        if k in D['AdjustGrid']:
-            d=D['AdjustGrid'][k]['Extents']['Extent[0]']
-            t=d[:,0]-tref
-            axs2[4].plot(t,d[:,1], label=k+" Nr")
-            d=D['AdjustGrid'][k]['Extents']['Extent[1]']
-            t=d[:,0]-tref
-            axs2[4].plot(t,d[:,1], label=k+" Ntheta")
-
-
-    # proper sep horizon
-    for k in D['sep'].keys():
-        if k=='t': continue
-        d=D['sep'][k]
-        t=d[:,0]-tref
-        axs2[5].plot(t,d[:,1],label=k)
-
-
-    # time-step size
-    for k in ['dt',]:
-        d=D['TStepperDiag'][k]
-        t=d[:,0]-tref
-        axs2[6].plot(t,d[:,1],label=k)
-
-    for k in 'MaxAllowedTstep', 'Tdamp(LambdaFactorA0)', 'Tdamp(LambdaFactorB0)':
-        d=D['GrAdjustMaxTstepToDampingTimes'][k]
-        t=d[:,0]-tref
-        axs2[6].plot(t,d[:,1],label=k)
-    axs2[6].set_yscale('log')
-
-
-    # common horizon in ForContinuation
-    HaveContinuation = ( len(D['ForContinuation'].keys())>0 )
-    if HaveContinuation:
-        for k in 'L_surface', 'L_mesh', 'L_max':
-            d=D['ForContinuation'][k]
-            t=d[:,0]-tref
-            axs2[7].plot(t,d[:,1],label=k)
-        tmp=axs2[7].get_xlim()
-        plot_utils.AnnotateSegments(axs2[7], D, TerminationReason=True, tref=tref,
-                                    font_size=10)
-        axs2[7].set_xlim(tmp)
-        axs2[7].legend(fontsize=8)
-        axs2[7].set_xlabel(xaxis_label)
-    axs2[7].set_title("ForContinuation/AhC")  # always write title
-
-    # OVERALL COSMETICS
-    for ax in axs0+axs1+axs2[:-1]:  # skip ForContinuation plot, which not always has data
-        ax.legend(fontsize=8)
-        ax.set_xlabel(xaxis_label)
-        if xlim is not None:
-            ax.set_xlim(xlim)
-            #try:
-            #    autoscale(ax)
-            #except ValueError:
-            #    pass
-            autoscale(ax)
-
-    # AnnotateSegments after autoscale for nice placement
-    plot_utils.AnnotateSegments(axs2[5], D,
-                                TerminationReason=PrintTerminationReason,
-                                tref=tref, font_size=10)
+        for k in D['Ah'+AH].keys():
+            if k=='time' or k in self.ignore1: continue
+            d=D['Ah'+AH][k]
+            for idx in self._map1.get(k, [0]):
+                if k=='NumIterations':
+                    self._plot(axs1[idx], k, d, '.', label=k)
+                else:
+                    self._plot(axs1[idx], k, d, label=k)
+
+        for idx,panel in enumerate(self.Panels2):
+            for k in panel:
+                self._plot(axs2[idx], k, D['GrAdjustSubChunksToDampingTimes'][k], label=k)
+
+        # AdjustGridExtents
+        sphere=AH
+        if AH=='C': sphere='D' # innermost spheres in ringdown are SphereD*
+        for k in 'Sphere'+sphere+'0', 'Sphere'+sphere+'1', 'Sphere'+sphere+'2':
+            if k in D['AdjustGrid']:
+                self._plot(axs2[4], k+" Nr", D['AdjustGrid'][k]['Extents']['Extent[0]'],
+                           label=k+" Nr")
+                self._plot(axs2[4], k+" Ntheta", D['AdjustGrid'][k]['Extents']['Extent[1]'],
+                           label=k+" Ntheta")
+
+        # proper sep horizon
+        for k in D['sep'].keys():
+            if k=='t': continue
+            self._plot(axs2[5], k, D['sep'][k], label=k)
+
+        # time-step size
+        for k in ['dt',]:
+            self._plot(axs2[6], k, D['TStepperDiag'][k], label=k)
+        for k in 'MaxAllowedTstep', 'Tdamp(LambdaFactorA0)', 'Tdamp(LambdaFactorB0)':
+            self._plot(axs2[6], k, D['GrAdjustMaxTstepToDampingTimes'][k], label=k)
+
+        # common horizon in ForContinuation
+        HaveContinuation = ( len(D['ForContinuation'].keys())>0 )
+        if HaveContinuation:
+            for k in 'L_surface', 'L_mesh', 'L_max':
+                self._plot(axs2[7], k, D['ForContinuation'][k], label=k)
+            axs2[7].relim()
+            axs2[7].autoscale_view()
+            tmp=axs2[7].get_xlim()
+            self._annotate(axs2[7], TerminationReason=True)
+            axs2[7].set_xlim(tmp)
+            axs2[7].legend(fontsize=8)
+            axs2[7].set_xlabel(self.xaxis_label)
+        elif axs2[7].get_legend() is not None:
+            axs2[7].get_legend().remove()
+
+        # lines of data that disappeared from D
+        for key in set(self._lines)-self._current:
+            self._lines.pop(key).remove()
+
+        # OVERALL COSMETICS
+        for ax in axs0+axs1+axs2[:-1]:  # skip ForContinuation plot, which not always has data
+            ax.legend(fontsize=8)
+            ax.set_xlabel(self.xaxis_label)
+            if self.xlim is not None:
+                ax.set_xlim(self.xlim)
+                autoscale(ax)
+            elif len(ax.lines)>0:
+                ax.relim()
+                ax.autoscale_view()
+
+        # AnnotateSegments after autoscale for nice placement
+        self._annotate(axs2[5], TerminationReason=self.PrintTerminationReason)
+
+        for fig in self.figures:
+            fig.canvas.draw_idle()
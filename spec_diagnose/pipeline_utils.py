@@ -0,0 +1,106 @@
+"""
+Overlap reading files with parsing them.
+
+A PipelineExecutor reads the bytes of upcoming files on a reader thread,
+while a pool of workers parses the files read before.  At most 'depth'
+files are read ahead of the parsing, so memory stays bounded if parsing
+is slower than reading, and the filesystem is kept busy if it is the
+other way round.  Pass executor='pipeline' (or a PipelineExecutor) to
+segment_utils.ImportRun and the loaders.
+
+Example:
+  with PipelineExecutor(max_workers=4) as pool:
+      D=ImportRun(EvDir, 2, executor=pool)
+"""
+
+import os
+import threading
+
+from collections import deque
+
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
+
+
+def ReadBytes(F):
+    """content of the file F, None if it does not exist"""
+    try:
+        with open(F, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+class PipelineExecutor(Executor):
+    """
+PipelineExecutor(max_workers=None, parse='thread', depth=None, readers=1)
+
+concurrent.futures.Executor with a separate stage for reading files.
+  max_workers -- number of workers parsing files (default: number of CPUs)
+  parse       -- 'thread' or 'process', the kind of parse workers.  Processes
+                 parse in parallel, threads avoid copying the bytes read.
+  depth       -- maximum number of files read but not parsed yet
+                 (default: 2*max_workers)
+  readers     -- number of threads reading files
+
+map_prefetched(fn, files) reads the files on the reader threads and
+calls fn(F, buf=content) on the parse workers.  submit() and map() run
+their functions on the parse workers, without reading ahead.
+"""
+
+    def __init__(self, max_workers=None, parse='thread', depth=None, readers=1):
+        if max_workers is None:
+            max_workers=os.cpu_count() or 1
+        if parse=='thread':
+            self._pool=ThreadPoolExecutor(max_workers=max_workers)
+        elif parse=='process':
+            self._pool=ProcessPoolExecutor(max_workers=max_workers)
+        else:
+            raise ValueError("parse must be 'thread' or 'process', got {}".format(parse))
+        self._readers=ThreadPoolExecutor(max_workers=readers)
+        self._slots=threading.Semaphore(depth if depth is not None else 2*max_workers)
+
+    def submit(self, fn, *args, **kwargs):
+        return self._pool.submit(fn, *args, **kwargs)
+
+    def map_prefetched(self, fn, files):
+        """
+map_prefetched(fn, files)
+
+[fn(F, buf=ReadBytes(F)) for F in files], reading ahead on the reader
+threads while the parse workers run fn.  buf is None if F does not exist.
+
+Each file takes a slot before its read is submitted, in the order of
+'files', and frees it when its parse is done.  So the files being read
+are always the next ones to be parsed, whatever the number of readers.
+"""
+        release=lambda future: self._slots.release()
+        files=deque(files)
+        reads=deque()   # (F, future) read or being read, not handed to a parse worker
+        parses=[]
+        try:
+            while files or reads:
+                # read ahead as far as slots are free; wait for one only
+                # if there is nothing to parse meanwhile
+                while files and self._slots.acquire(blocking=len(reads)==0):
+                    F=files.popleft()
+                    try:
+                        reads.append((F, self._readers.submit(ReadBytes, F)))
+                    except BaseException:
+                        self._slots.release()
+                        raise
+                if reads:
+                    F,read=reads[0]
+                    parse=self._pool.submit(fn, F, buf=read.result())
+                    reads.popleft()
+                    parse.add_done_callback(release)
+                    parses.append(parse)
+            return [parse.result() for parse in parses]
+        finally:
+            for F,read in reads:
+                # never handed to a parse worker: free the slot once the read ends
+                read.cancel()
+                read.add_done_callback(release)
+
+    def shutdown(self, wait=True, *, cancel_futures=False):
+        self._readers.shutdown(wait=wait, cancel_futures=cancel_futures)
+        self._pool.shutdown(wait=wait, cancel_futures=cancel_futures)
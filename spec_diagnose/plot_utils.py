@@ -4,6 +4,95 @@ docstring of plot_utils.
 
 
 import re
+import numpy as np
+
+from collections.abc import Mapping
+
+import spec_diagnose.segment_utils as segment_utils
+import spec_diagnose.stream_utils as stream_utils
+from spec_diagnose.column_utils import ColumnBuffer, RunTable
+
+def _NextColor(ax):
+    """next color of the property cycle of ax"""
+    lines=ax._get_lines
+    if hasattr(lines, 'get_next_color'):
+        return lines.get_next_color()
+    # matplotlib < 3.1
+    return next(lines.prop_cycler)['color']
+
+
+def _DatArray(group, name):
+    """[time, value] array of the one-column dat-file 'name' in an h5 group,
+which the h5 loaders return as dictionary legend -> array"""
+    tmp=group[name]
+    if isinstance(tmp, Mapping):
+        tmp=tmp[name]
+    return tmp
+
+
+def Decimate(x, y, max_points=None, xlim=None):
+    """
+Decimate(x, y, max_points=None, xlim=None)
+
+Reduce the time-series y(x) to about max_points points for plotting.
+The points are split into max_points/2 bins, and the minimum and maximum
+of y in each bin are kept, so that spikes survive the decimation.
+  max_points -- if None, or if y has fewer points, x and y are returned unchanged
+  xlim       -- (xmin, xmax) visible part of the x-axis (in the plotted
+                coordinates, i.e. after subtracting tref).  Points inside
+                are kept at full resolution if they are fewer than
+                max_points, points outside are decimated separately.
+
+Returns x,y
+"""
+    x=np.asarray(x)
+    y=np.asarray(y)
+    if max_points is None or len(x)<=max_points:
+        return x,y
+    if xlim is None:
+        idx=_EnvelopeIndex(y, max_points)
+    else:
+        if np.all(x[:-1]<=x[1:]):
+            lo,hi=np.searchsorted(x, [min(xlim), max(xlim)])
+        else:
+            # non-monotonic time (e.g. overlapping segments), no window
+            lo,hi=0,len(x)
+        parts=[]
+        for a,b in (0,lo), (lo,hi), (hi,len(x)):
+            if b>a:
+                parts.append(a+_EnvelopeIndex(y[a:b], max_points))
+        idx=np.concatenate(parts)
+    return x[idx], y[idx]
+
+
+def _EnvelopeIndex(y, max_points):
+    """indices of the first and last point, and of the minimum and
+maximum of y in each of max_points/2 bins of equal length"""
+    n=len(y)
+    if n<=max_points:
+        return np.arange(n)
+    nbins=max(max_points//2, 1)
+    binsize=-(-n//nbins)
+    # pad by repeating the last value, so the bins form a matrix
+    tmp=np.concatenate([y, np.repeat(y[-1:], nbins*binsize-n)]).reshape(nbins, binsize)
+    offsets=np.arange(nbins)*binsize
+    idx=np.concatenate([[0, n-1],
+                        np.minimum(offsets+np.argmin(tmp, axis=1), n-1),
+                        np.minimum(offsets+np.argmax(tmp, axis=1), n-1)])
+    return np.unique(idx)
+
+
+def PlotDecimated(ax, x, y, *args, max_points=None, xlim=None, **kwargs):
+    """
+ax.plot(x, y, *args, **kwargs) with x,y decimated to about max_points
+points, see Decimate.  If xlim is None and the x-limits of ax were set
+explicitly, these are used as the visible window.
+"""
+    if max_points is not None and xlim is None and not ax.get_autoscalex_on():
+        xlim=ax.get_xlim()
+    x,y=Decimate(x, y, max_points, xlim)
+    return ax.plot(x, y, *args, **kwargs)
+
 
 def AnnotateSegments(ax, RunDict, y=None, TerminationReason=False,
                      tref=0., font_size=None):
@@ -46,7 +135,8 @@ Annote a plot with information where segments begin.
                 rotation='vertical',verticalalignment='bottom', clip_on=True)
 
 
-def PlotTruncationErrorSubdomain(ax, AdjustGrid, SD, tref=0., PileUpModes=False):
+def PlotTruncationErrorSubdomain(ax, AdjustGrid, SD, tref=0., PileUpModes=False,
+                                 max_points=None):
     """
 Plot quantities relevant to assess truncation error for one subdomain.
 
@@ -54,14 +144,13 @@ ax -- axis object into which to plot data
 AdjustGrid -- AdjustGrid dictionary, to be indexed by 'SD'
 SD         -- name of the spherical shell to be plotted
 tref       -- use t-tref as xaxis
+max_points -- decimate each curve to about max_points points, see Decimate
 """
 
     a=AdjustGrid[SD] # shortcut
 
     # ==== get colors ====
-    colors=[next(ax._get_lines.prop_cycler)['color'],
-            next(ax._get_lines.prop_cycler)['color'],
-            next(ax._get_lines.prop_cycler)['color']]
+    colors=[_NextColor(ax), _NextColor(ax), _NextColor(ax)]
 
     # ==== construct labels ====
     labels=['0','1','2']
@@ -105,14 +194,16 @@ tref       -- use t-tref as xaxis
 
     # Step 2: plot
     for idx,bf in enumerate(bfs):
-        tmp=a[bf]['TruncationErrorExcess']
-        ax.plot(tmp[:,0]-tref,tmp[:,1],'--',color=colors[idx],label='TruncErrExcess-{}'.format(labels[idx]),linewidth=1.5)
+        tmp=_DatArray(a[bf], 'TruncationErrorExcess')
+        PlotDecimated(ax, tmp[:,0]-tref,tmp[:,1],'--',color=colors[idx],label='TruncErrExcess-{}'.format(labels[idx]),linewidth=1.5,
+                      max_points=max_points)
         tmp_idx=tmp[:,1]>0
         if sum(tmp_idx)>0:
             ax.plot(tmp[tmp_idx,0]-tref,tmp[tmp_idx,1],'o',color=colors[idx])
         if PileUpModes:
-            tmp=a[bf]['MinNumberOfPiledUpModes']
-            ax.plot(tmp[:,0]-tref,tmp[:,1],':', linewidth=1.5, color=colors[idx], label='# PileUpModes-{}'.format(labels[idx]))
+            tmp=_DatArray(a[bf], 'MinNumberOfPiledUpModes')
+            PlotDecimated(ax, tmp[:,0]-tref,tmp[:,1],':', linewidth=1.5, color=colors[idx], label='# PileUpModes-{}'.format(labels[idx]),
+                          max_points=max_points)
     if tref==0:
         ax.set_xlabel('t/M')
     else:
@@ -122,7 +213,51 @@ tref       -- use t-tref as xaxis
     return
 
 
-def PlotSubdomainConstraints(ax, GhCe, N=5, Ngrey=0):
+def RankSubdomains(GhCe, N=None):
+    """
+Rank the subdomains by the maximum of their constraints.
+  GhCe -- a dictionary containing constraint info, as obtained with
+          segment_utils.LoadDat_from_segments (or a column_utils.RunTable),
+          or the per-segment stream
+          of segment_utils.IterDat_from_segments.  The stream is reduced
+          segment by segment, so the whole run is never in memory.
+  N    -- return only the N subdomains with largest maximum (default: all)
+
+Returns (legends, maxima), ordered by decreasing maximum.  Subdomains
+with equal maxima are kept in their original order.
+"""
+    if isinstance(GhCe, RunTable):
+        # one reduction over all columns; absent values are NaN and ignored
+        legends=[legend for legend in GhCe if legend!='time']
+        maxima=np.fmax.reduce(GhCe.data, axis=0, initial=-np.inf)
+        maxima=maxima[[GhCe.names.index(legend) for legend in legends]]
+    elif isinstance(GhCe, Mapping):
+        legends=[legend for legend in GhCe if legend!='time']
+        maxima=np.array([np.max(GhCe[legend][:,1]) if len(GhCe[legend])>0
+                         else -np.inf for legend in legends], dtype=float)
+    else:
+        (MinMax,)=stream_utils.Reduce(GhCe, stream_utils.RunningMinMax())
+        legends=[legend for legend in MinMax if legend!='time']
+        maxima=np.array([MinMax[legend][1] for legend in legends], dtype=float)
+    maxima[np.isnan(maxima)]=-np.inf
+
+    if N is None or N>=len(legends):
+        idx=np.arange(len(legends))
+    elif N<=0:
+        idx=np.arange(0)
+    else:
+        # the N-th largest maximum, then all larger ones and, of those
+        # equal to it, the first ones in original order.  Sort only these.
+        kth=-np.partition(-maxima, N-1)[N-1]
+        above=np.flatnonzero(maxima>kth)
+        tied=np.flatnonzero(maxima==kth)[:N-len(above)]
+        idx=np.sort(np.concatenate([above, tied]))
+    idx=idx[np.argsort(-maxima[idx], kind='stable')]
+    return [legends[i] for i in idx], maxima[idx]
+
+
+def PlotSubdomainConstraints(ax, GhCe, N=5, Ngrey=0, filename=None, cache=None,
+                             max_points=None):
     """
 Make a plot of constraints.
   ax -- axes to plot into
@@ -130,23 +265,40 @@ Make a plot of constraints.
   title -- title of plot
   N -- plot the N subdomains with largest GhCe
   Ngrey -- plot the next 'Ngrey' subdomains in grey
+  filename -- if given, GhCe is a list of segments, and the constraints
+              are streamed from 'filename' in each segment.  Only the
+              plotted subdomains are kept in memory.
+  cache -- cache_utils.SegmentCache (or its directory), with 'filename'
+  max_points -- decimate each curve to about max_points points, see Decimate
+
+  Example:
+    PlotSubdomainConstraints(ax, run['segs'], N=5, Ngrey=20,
+                             filename='ConstraintNorms/GhCe_Linf.dat')
 """
-    maxD={}
-    for legend,data in GhCe.items():
-        if legend=='time': continue
-        maxD[max(data[:,1])]=legend
-    biggest=sorted(maxD.keys(),reverse=True)
+    if filename is None:
+        biggest,maxima=RankSubdomains(GhCe, N+Ngrey)
+        data={legend: GhCe[legend] for legend in biggest}
+    else:
+        segs=GhCe
+        biggest,maxima=RankSubdomains(
+            segment_utils.IterDat_from_segments(segs, filename, cache=cache),
+            N+Ngrey)
+        buf={legend: ColumnBuffer() for legend in biggest}
+        for seg,t,D in segment_utils.IterDat_from_segments(segs, filename,
+                                                            cache=cache):
+            for legend in biggest:
+                if legend in D:
+                    buf[legend].append(D[legend].copy())
+        data={legend: buf[legend].array() for legend in biggest}
     if N>len(biggest): N=len(biggest)
-    if N+Ngrey>len(biggest): Ngrey=len(biggest)-N
-    for b in biggest[:N]:
-        legend=maxD[b]
-        data=GhCe[legend]
-        ax.plot(data[:,0],data[:,1],label=legend)
 
-    for b in biggest[N:N+Ngrey]:
-        legend=maxD[b]
-        data=GhCe[legend]
-        ax.plot(data[:,0],data[:,1],color='grey', lw=0.5)
+    for legend in biggest[:N]:
+        PlotDecimated(ax, data[legend][:,0],data[legend][:,1],label=legend,
+                      max_points=max_points)
+
+    for legend in biggest[N:]:
+        PlotDecimated(ax, data[legend][:,0],data[legend][:,1],color='grey', lw=0.5,
+                      max_points=max_points)
 
     ax.set_xlabel('t/M')
     ax.legend(fontsize='xx-small')
@@ -154,11 +306,12 @@ Make a plot of constraints.
 
 
 
-def PlotAH(ax, AH_dat, NormalizeRadii=True, title=None):
+def PlotAH(ax, AH_dat, NormalizeRadii=True, title=None, max_points=None):
     """PlotAH(ax, AH)
     plot useful information about an apparent horizon.
     ax - axis object into which to plot the data
     AH - a dictionary with columns from Ah?.dat, as read by LoadDat_from_segments
+    max_points - decimate each curve to about max_points points, see Decimate
  """
 
     # Plot rmin and rmax, possibly normalized
@@ -171,24 +324,24 @@ def PlotAH(ax, AH_dat, NormalizeRadii=True, title=None):
 
     for q in 'min', 'max':
         # get a color for both curves
-        color=next(ax._get_lines.prop_cycler)['color']
+        color=_NextColor(ax)
         tmp=q+'(r)'
         d=AH_dat[tmp]
-        ax.plot(d[:,0],d[:,1]/norm,color=color, label=tmp+label_postfix)
+        PlotDecimated(ax, d[:,0],d[:,1]/norm,color=color, label=tmp+label_postfix, max_points=max_points)
         tmp=q+'(|r^i-c^i|)'
         d=AH_dat[tmp]
-        ax.plot(d[:,0],d[:,1]/norm, '--', color=color, label=tmp+label_postfix)
+        PlotDecimated(ax, d[:,0],d[:,1]/norm, '--', color=color, label=tmp+label_postfix, max_points=max_points)
 
     # plot remaining quantities
     d=AH_dat['sqrt(Area/16pi)']
-    ax.plot(d[:,0],d[:,1],label='Mirr')
+    PlotDecimated(ax, d[:,0],d[:,1],label='Mirr', max_points=max_points)
 
     d=AH_dat['L_surface']
-    ax.plot(d[:,0],d[:,1]/10, label='L_surface/10')
+    PlotDecimated(ax, d[:,0],d[:,1]/10, label='L_surface/10', max_points=max_points)
     d=AH_dat['NumIterations']
-    ax.plot(d[:,0],d[:,1]/10, lw=0.5, color='grey', label='Niterations/10')
+    PlotDecimated(ax, d[:,0],d[:,1]/10, lw=0.5, color='grey', label='Niterations/10', max_points=max_points)
     d=AH_dat['convg reason']
-    ax.plot(d[:,0],d[:,1]/10, 'k--', lw=0.5, label='convg reason/10')
+    PlotDecimated(ax, d[:,0],d[:,1]/10, 'k--', lw=0.5, label='convg reason/10', max_points=max_points)
 
     ax.set_xlabel('t/M')
     ax.legend(fontsize='xx-small');
@@ -197,15 +350,19 @@ def PlotAH(ax, AH_dat, NormalizeRadii=True, title=None):
         ax.set_title(title,fontsize='x-large')
 
 
-def PlotGravitationalWave(ax, waveform, l, m, label=None, title=None, RIndex=-1):
+def PlotGravitationalWave(ax, waveform, l, m, label=None, title=None, RIndex=-1,
+                          max_points=None):
     """
 Make a plot of gravitational waves.
   ax       -- axes to plot into
-  waveform -- waveform data to plot (imported rh* or rPsi4* file with radii-entries)
+  waveform -- waveform data to plot (imported rh* or rPsi4* file with radii-entries),
+              or a waveform_utils.Waveform, of which only the plotted
+              radius and mode are read
   l,m      -- which mode to plot
   label    -- label for legend and axis, e.g. Psi4, h, M*Psi4, h/M
               Keep current label if option is not provided.
   RIndex -- index of wave extraction radius, default: -1 (outermost radius)
+  max_points -- decimate each curve to about max_points points, see Decimate
 
   Example:
     PlotGravitionalWave(ax, run['Psi4'], 2, 2, label='Psi4', RIndex=-1)
@@ -220,8 +377,8 @@ Make a plot of gravitational waves.
     ImData=Ylm[keylist[2]]
 
     if label is not None:
-        ax.plot(ReData[:,0],ReData[:,1], label='Re '+label+' Y'+format(l)+format(m)+'('+Radius+')')
-        ax.plot(ImData[:,0],ImData[:,1], label='Im '+label+' Y'+format(l)+format(m)+'('+Radius+')')
+        PlotDecimated(ax, ReData[:,0],ReData[:,1], max_points=max_points, label='Re '+label+' Y'+format(l)+format(m)+'('+Radius+')')
+        PlotDecimated(ax, ImData[:,0],ImData[:,1], max_points=max_points, label='Im '+label+' Y'+format(l)+format(m)+'('+Radius+')')
         ax.legend(fontsize='x-small')
         ax.set_ylabel(label)
 
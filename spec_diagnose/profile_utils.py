@@ -0,0 +1,102 @@
+"""
+Timing and I/O statistics of ImportRun and the loaders.
+
+Pass an ImportProfile as option 'profile' to segment_utils.ImportRun,
+LoadDat_from_segments or LoadH5_from_segments.  It collects one record
+per file and segment, and one per loader, which show where an import
+spends its time.
+
+Example:
+  prof=ImportProfile()
+  D=ImportRun(path_to_ev, 2, profile=prof)
+  prof.print_summary()
+  slow=prof.slowest(5)     # the 5 slowest (file, segment) reads
+"""
+
+import threading
+
+
+class ImportProfile:
+    """
+ImportProfile(hook=None)
+
+Collector of timing records.  Each record is a dictionary with the keys
+  phase    -- 'read'     reading and parsing one file of one segment
+              'concat'   joining the data of all segments of one file
+              'loader'   one call of a loader, i.e. all of the above for one file
+              'FindLatestSegments', 'ImportRun'
+  filename -- file name relative to the segment (None for 'FindLatestSegments', 'ImportRun')
+  segment  -- the segment ('read' only)
+  wall     -- wall-time in seconds
+and, for 'read' records,
+  bytes    -- bytes read: the size of a .dat file (or the part read by
+              RefreshRun), the data read from an .h5 file
+  rows     -- number of rows read (summed over the data-sets of an .h5 file)
+  read     -- seconds spent reading a .dat file
+  parse    -- seconds spent converting a .dat file into numbers
+  cached   -- True if the file was taken from a cache_utils.SegmentCache
+
+hook -- if given, hook(record) is called for each new record, e.g. to
+        log slow files while the import is running.  It may be called
+        from several threads concurrently.
+"""
+
+    def __init__(self, hook=None):
+        self.hook=hook
+        self.records=[]
+        self._lock=threading.Lock()
+
+    def record(self, phase, filename=None, **kwargs):
+        """Add a record, see the class documentation for the keys"""
+        rec=dict(phase=phase, filename=filename, **kwargs)
+        with self._lock:
+            self.records.append(rec)
+        if self.hook is not None:
+            self.hook(rec)
+        return rec
+
+    def slowest(self, n=10, phase='read'):
+        """the n records of 'phase' with the largest wall-time"""
+        return sorted((rec for rec in self.records if rec['phase']==phase),
+                      key=lambda rec: rec['wall'], reverse=True)[:n]
+
+    def summary(self):
+        """
+Totals for each file name: dictionary filename -> dictionary with the keys
+  segments -- number of segments read
+  wall     -- seconds in the loader
+  read, parse, concat -- seconds reading, parsing and joining segments
+  bytes, rows         -- summed over the segments
+"""
+        out={}
+        for rec in self.records:
+            if rec['filename'] is None:
+                continue
+            s=out.setdefault(rec['filename'], {'segments': 0, 'wall': 0., 'read': 0.,
+                                               'parse': 0., 'concat': 0.,
+                                               'bytes': 0, 'rows': 0})
+            if rec['phase']=='read':
+                s['segments']+=1
+                for k in 'read', 'parse', 'bytes', 'rows':
+                    s[k]+=rec.get(k) or 0
+            elif rec['phase']=='concat':
+                s['concat']+=rec['wall']
+            elif rec['phase']=='loader':
+                s['wall']+=rec['wall']
+        return out
+
+    def report(self):
+        """All records and the summary, as json-serializable dictionary"""
+        return {'records': list(self.records), 'summary': self.summary()}
+
+    def print_summary(self):
+        """Print the summary, slowest files first"""
+        print('{:<45} {:>5} {:>9} {:>9} {:>9} {:>9} {:>10} {:>9}'.format(
+            'file', 'segs', 'wall[s]', 'read[s]', 'parse[s]', 'concat[s]', 'MB', 'rows'))
+        for filename,s in sorted(self.summary().items(), key=lambda item: -item[1]['wall']):
+            print('{:<45} {:>5} {:9.3f} {:9.3f} {:9.3f} {:9.3f} {:10.2f} {:>9}'.format(
+                filename, s['segments'], s['wall'], s['read'], s['parse'],
+                s['concat'], s['bytes']/2**20, s['rows']))
+        for rec in self.records:
+            if rec['filename'] is None:
+                print('{:<45} {:>15.3f}'.format(rec['phase'], rec['wall']))
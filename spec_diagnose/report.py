@@ -0,0 +1,301 @@
+"""
+Batch reports: render the standard diagnostic figures of many runs to files.
+
+  spec-diagnose report -L 2 -o reports /path/to/run1/Ev /path/to/run2/Ev
+
+imports each run with segment_utils.ImportRun, and writes the
+control-system, apparent-horizon, constraint and truncation-error
+figures into reports/<run>/Lev2/.  Runs are processed on a pool of
+processes.  Since a large run needs several GB while it is imported and
+plotted, no more runs are started at a time than fit into the available
+memory (see --mem-per-run).
+"""
+
+import os
+import sys
+import glob
+import argparse
+import traceback
+
+import matplotlib
+import matplotlib.pyplot as plt
+
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+import spec_diagnose.segment_utils as segment_utils
+import spec_diagnose.archive_utils as archive_utils
+import spec_diagnose.plot_utils as plot_utils
+import spec_diagnose.control_systems as control_systems
+
+# directories of a segment with the files read by ImportRun
+_DATA_DIRS=['', 'ApparentHorizons', 'ConstraintNorms', 'ForContinuation']
+
+
+class FigureError(RuntimeError):
+    """
+Raised by ReportRun if figures could not be made for data the run has.
+  written -- the files that were written nevertheless
+  failed  -- list of (figure name, error message)
+"""
+    def __init__(self, written, failed):
+        self.written=written
+        self.failed=failed
+        super().__init__("could not make {}".format(
+            ', '.join('{} ({})'.format(name, msg) for name,msg in failed)))
+
+
+def ReportRun(EvDir, Lev, outdir, fmt='png', tmin=-1e10, tmax=1e10,
+              max_points=20000, cache=None, verbosity=0):
+    """
+ReportRun(EvDir, Lev, outdir, fmt='png', ...)
+
+Import one run and save its diagnostic figures as files outdir/*.fmt.
+  EvDir, Lev  -- Ev/ directory and Lev of the run
+  outdir      -- directory for the figures (created if needed)
+  fmt         -- file format, e.g. 'png' or 'pdf'
+  tmin, tmax  -- time-range to import, see ImportRun
+  max_points  -- decimate each curve to about max_points points, see plot_utils.Decimate
+  cache       -- cache_utils.SegmentCache (or its directory), see ImportRun
+
+Figures are only made for the data present in the run.  If one of them
+fails, the others are still saved, and FigureError is raised at the end.
+
+Returns the list of files written.
+"""
+    os.makedirs(outdir, exist_ok=True)
+    D=segment_utils.ImportRun(EvDir, Lev, tmin=tmin, tmax=tmax,
+                              verbosity=verbosity, cache=cache)
+    written=[]
+    failed=[]
+
+    def Save(name, MakeFigures):
+        """call MakeFigures(), and save all figures it created"""
+        before=set(plt.get_fignums())
+        try:
+            MakeFigures()
+            new=[n for n in plt.get_fignums() if n not in before]
+            for idx,num in enumerate(new):
+                suffix='' if len(new)==1 else '_{}'.format(idx)
+                F=os.path.join(outdir, '{}{}.{}'.format(name, suffix, fmt))
+                plt.figure(num).savefig(F, bbox_inches='tight')
+                written.append(F)
+        except Exception as e:
+            print("WARNING: {} Lev{}: could not make {}: {}: {}".format(
+                EvDir, Lev, name, type(e).__name__, e))
+            failed.append((name, '{}: {}'.format(type(e).__name__, e)))
+        finally:
+            for num in plt.get_fignums():
+                if num not in before:
+                    plt.close(num)
+
+    for AH in 'A', 'B', 'C':
+        if len(D.get('DiagAhSpeed'+AH, {}))>0:
+            Save('ControlSystems'+AH, lambda: control_systems.PlotControlSystems(
+                D, AH, max_points=max_points))
+
+    for AH in 'A', 'B', 'C':
+        if len(D.get('Ah'+AH, {}))>0:
+            def MakeAH():
+                fig,ax=plt.subplots(figsize=[8,5])
+                plot_utils.PlotAH(ax, D['Ah'+AH], title='Ah'+AH, max_points=max_points)
+            Save('Ah'+AH, MakeAH)
+
+    if len(D.get('GhCeLinf', {}))>0:
+        def MakeConstraints():
+            fig,ax=plt.subplots(figsize=[8,5])
+            plot_utils.PlotSubdomainConstraints(ax, D['GhCeLinf'], N=5, Ngrey=20,
+                                                max_points=max_points)
+            plot_utils.AnnotateSegments(ax, D)
+            ax.set_title('GhCe_Linf')
+        Save('Constraints', MakeConstraints)
+
+    # innermost shells of each horizon
+    for SD in 'SphereA0', 'SphereB0', 'SphereC0', 'SphereD0':
+        if SD in D.get('AdjustGrid', {}):
+            def MakeTruncationError():
+                fig,ax=plt.subplots(figsize=[8,5])
+                plot_utils.PlotTruncationErrorSubdomain(ax, D['AdjustGrid'], SD,
+                                                        max_points=max_points)
+            Save('TruncationError'+SD, MakeTruncationError)
+    if failed:
+        raise FigureError(written, failed)
+    return written
+
+
+def EstimateMemory(EvDir, Lev):
+    """
+Rough estimate of the memory (in bytes) needed by ReportRun: a few
+times the size of the files it reads, plus the memory for the figures.
+"""
+    size=0
+    for seg in glob.glob(os.path.join(EvDir, 'Lev{}_*'.format(Lev), 'Run')) \
+             +glob.glob(os.path.join(EvDir, 'Lev{}_Ringdown'.format(Lev),
+                                     'Lev{}_*'.format(Lev), 'Run')):
+        for d in _DATA_DIRS:
+            try:
+                with os.scandir(os.path.join(seg, d)) as it:
+                    for entry in it:
+                        if entry.name.endswith(('.dat', '.h5')) and entry.is_file():
+                            size+=entry.stat().st_size
+            except OSError:
+                pass
+    return 3*size+500*2**20
+
+
+def AvailableMemory():
+    """Memory (in bytes) available for new processes, None if unknown"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1])*1024
+    except OSError:
+        pass
+    try:
+        return os.sysconf('SC_AVPHYS_PAGES')*os.sysconf('SC_PAGE_SIZE')
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+def _RunName(EvDir):
+    """name of the run, e.g. 'BBH_q1' for /path/to/BBH_q1/Ev or for a
+compacted run /path/to/BBH_q1.h5"""
+    EvDir=os.path.abspath(EvDir)
+    if os.path.isfile(EvDir):
+        return os.path.splitext(os.path.basename(EvDir))[0]
+    if os.path.basename(EvDir)=='Ev':
+        EvDir=os.path.dirname(EvDir)
+    return os.path.basename(EvDir)
+
+
+def _ReportJob(EvDir, Lev, outdir, options):
+    """ReportRun in a worker process.  Returns (written files, error)"""
+    matplotlib.use('Agg')
+    try:
+        return ReportRun(EvDir, Lev, outdir, **options), None
+    except FigureError as e:
+        return e.written, str(e)
+    except Exception:
+        return [], traceback.format_exc()
+
+
+def ReportRuns(runs, outdir, workers=None, mem_per_run=None, **options):
+    """
+ReportRuns(runs, outdir, workers=None, mem_per_run=None, **options)
+
+ReportRun for many runs, on a pool of processes.
+  runs        -- list of (EvDir, Lev)
+  outdir      -- the figures of each run go to outdir/<run>/Lev<Lev>
+  workers     -- maximum number of runs processed at a time (default: number of CPUs)
+  mem_per_run -- memory (in bytes) needed by one run.  If None, it is
+                 estimated from the size of each run's files (EstimateMemory).
+                 Runs are only started while their memory fits into the
+                 available memory, but at least one run is processed.
+  options     -- further options of ReportRun
+
+Returns dictionary (EvDir, Lev) -> (written files, error message or None)
+"""
+    if workers is None:
+        workers=os.cpu_count() or 1
+    budget=AvailableMemory()
+    names={}
+    jobs=[]
+    for EvDir,Lev in runs:
+        name=_RunName(EvDir)
+        names[name]=names.get(name, 0)+1
+        if names[name]>1:
+            name='{}_{}'.format(name, names[name])
+        need=mem_per_run if mem_per_run is not None else EstimateMemory(EvDir, Lev)
+        jobs.append(((EvDir, Lev), os.path.join(outdir, name, 'Lev{}'.format(Lev)), need))
+
+    results={}
+    running={}   # future -> (run, memory)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while jobs or running:
+            used=sum(need for run,need in running.values())
+            while jobs and len(running)<workers and \
+                  (len(running)==0 or budget is None or used+jobs[0][2]<=budget):
+                run,out,need=jobs.pop(0)
+                running[pool.submit(_ReportJob, run[0], run[1], out, options)]=(run, need)
+                used+=need
+            done,_=wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                run,need=running.pop(future)
+                results[run]=future.result()
+                print("{} Lev{}: {} files{}".format(
+                    run[0], run[1], len(results[run][0]),
+                    '' if results[run][1] is None else ', FAILED'), flush=True)
+    return results
+
+
+def main(argv=None):
+    """entry point of the spec-diagnose command"""
+    parser=argparse.ArgumentParser(prog='spec-diagnose',
+                                   description="Utility for diagnosing SpEC simulations")
+    sub=parser.add_subparsers(dest='command', required=True)
+    p=sub.add_parser('report', help="render diagnostic figures of runs to files")
+    p.add_argument('EvDirs', nargs='+',
+                   help="Ev/ directories of the runs, or compacted runs (see archive_utils)")
+    p.add_argument('-L', '--lev', type=int, nargs='+', default=[2],
+                   help="Levs to report for each run (default: 2)")
+    p.add_argument('-o', '--outdir', default='.', help="output directory")
+    p.add_argument('--format', default='png', help="file format, e.g. png or pdf")
+    p.add_argument('--tmin', type=float, default=-1e10,
+                   help="import data after tmin, negative: relative to the end of the run")
+    p.add_argument('--tmax', type=float, default=1e10, help="import data before tmax")
+    p.add_argument('--max-points', type=int, default=20000,
+                   help="decimate curves to about this many points")
+    p.add_argument('-j', '--workers', type=int, default=None,
+                   help="maximum number of runs processed at a time (default: number of CPUs)")
+    p.add_argument('--mem-per-run', type=float, default=None,
+                   help="memory needed per run in GB (default: estimate from file sizes)")
+    p.add_argument('--cache', default=None, help="directory of a SegmentCache")
+    p.add_argument('-v', '--verbosity', type=int, default=0)
+    p=sub.add_parser('benchmark', help="time the loaders and plot functions on synthetic runs")
+    p.add_argument('-o', '--out', default=None, help="json file for the results")
+    p.add_argument('--segments', type=int, nargs='+', default=[5, 20],
+                   help="numbers of segments of the synthetic runs")
+    p.add_argument('--rows', type=int, nargs='+', default=[100, 1000],
+                   help="rows per file of the synthetic runs")
+    p.add_argument('--repeat', type=int, default=3, help="timings of each case")
+    p.add_argument('--root', default=None,
+                   help="directory for the synthetic runs (default: temporary directory)")
+    p.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'), default=None,
+                   help="compare two json files written with -o, instead of running")
+    args=parser.parse_args(argv)
+
+    matplotlib.use('Agg')
+    if args.command=='benchmark':
+        import spec_diagnose.benchmark as benchmark
+        if args.compare is not None:
+            benchmark.CompareBenchmarks(*args.compare)
+        else:
+            try:
+                benchmark.RunBenchmarks(segments=args.segments, rows=args.rows,
+                                        repeat=args.repeat, root=args.root, out=args.out)
+            except benchmark.BenchmarkError as e:
+                print("ERROR: {}".format(e))
+                return 1
+        return 0
+
+    runs=[]
+    for EvDir in args.EvDirs:
+        for Lev in args.lev:
+            if glob.glob(os.path.join(EvDir, 'Lev{}_*'.format(Lev))) \
+               or archive_utils.IsCompactRun(EvDir):
+                runs.append((EvDir, Lev))
+            else:
+                print("WARNING: no Lev{} in {}".format(Lev, EvDir))
+    mem_per_run=None if args.mem_per_run is None else args.mem_per_run*2**30
+    results=ReportRuns(runs, args.outdir, workers=args.workers, mem_per_run=mem_per_run,
+                       fmt=args.format, tmin=args.tmin, tmax=args.tmax,
+                       max_points=args.max_points, cache=args.cache,
+                       verbosity=args.verbosity)
+    failed=[run for run,(written,error) in results.items() if error is not None]
+    for EvDir,Lev in failed:
+        print("ERROR: {} Lev{} failed:\n{}".format(EvDir, Lev, results[(EvDir,Lev)][1]))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,79 @@
 import os
+import io
 import sys
+import time
 import glob
 import re
+import bisect
+import functools
+import contextlib
+from collections.abc import Mapping
 import h5py
 import numpy as np
 
+from concurrent.futures import Executor, ThreadPoolExecutor, ProcessPoolExecutor
 from tqdm import tqdm
 
-def FindLatestSegments(EvDir, Lev, tmin=-1e10, tmax=1e10, WithRingdown=True):
+import spec_diagnose.cache_utils as cache_utils
+from spec_diagnose.pipeline_utils import PipelineExecutor
+from spec_diagnose.column_utils import ColumnBuffer, LegendColumns, LegendView, RunTable, \
+    StitchCutoffs
+
+def _FirstLastValue(F):
+    """First and last value of a file with one number per line, like
+RestartTimes.txt.  Only the first and the last line are read."""
+    with open(F,'rb') as f:
+        f.seek(0, os.SEEK_END)
+        size=f.tell()
+        f.seek(0)
+        lines=f.read(min(size, 4096)).split(b'\n')
+        first=next((line for line in lines if line.strip()), None)
+        if size>4096:
+            f.seek(size-4096)
+            lines=f.read().split(b'\n')[1:]  # first line may be incomplete
+        last=next((line for line in reversed(lines) if line.strip()), None)
+    if first is None or last is None:
+        raise IOError("{} is empty".format(F))
+    return float(first), float(last)
+
+
+def _SegmentInfo(seg):
+    """Start time and TerminationReason of one segment, see FindLatestSegments"""
+    if seg[-7:]=='_AA/Run':
+        # first segment (inspiral or ringdown), where RestartTimes.txt
+        # is not reporting the initial start of the run
+        # take Evolution.input instead
+        tmp=os.path.join(seg,'Evolution.input')
+        if not os.path.exists(tmp):
+            raise IOError("{}--did not find Evolutiuon.input".format(seg))
+        p=re.compile("^ *StartTime *= *(.+); *\n")
+        StartTime=None
+        for line in open(tmp):
+            m=p.match(line)
+            if m:
+                StartTime=float(m.group(1))
+        if StartTime is None:
+            raise IOError("{}--did not find StartTime in Evolution.input".format(seg))
+    else: # standard non-_AA segment
+        tmp=os.path.join(seg,'RestartTimes.txt')
+        if not os.path.exists(tmp):
+            raise IOError("{} not found--don't yet know how to handle this".format(tmp))
+        StartTime,_=_FirstLastValue(tmp)
+
+    tmp=os.path.join(seg,'TerminationReason.txt')
+    if os.path.exists(tmp):
+        with open(tmp, 'r') as myfile:
+            TerminationReason = myfile.readlines()[0]
+            prefix='Termination condition '
+            if TerminationReason.startswith(prefix):
+                TerminationReason=TerminationReason[len(prefix):-1]
+    else:
+        TerminationReason='ongoing'
+    return StartTime, TerminationReason
+
+
+def FindLatestSegments(EvDir, Lev, tmin=-1e10, tmax=1e10, WithRingdown=True,
+                       workers=None, cache=None):
     """
 Search through a usual SpEC segment structure, to find all
 segments with start-time tmin < tastart < tmax.  Negative
@@ -16,14 +82,20 @@ find the very last few segments.
 
 if WithRingdown==False, exclude ringdown segments
 
+workers -- if >1, read the metadata of the segments concurrently on
+           this many threads
+cache   -- cache_utils.SegmentCache (or its directory).  The metadata of
+           terminated segments is kept there, so that it is read only once.
+
 Procedure:
 1. Assemble list of existing directories
   [ ${EvDir}/Lev${Lev}_*] + [${EvDir}/Lev${Lev}_Ringdown/Lev${Lev}_* ]
 
-2. Go backward through the directories
-   2a. Retrieve start-time for each segment from DIR/Run/RestartTimes.txt
-   2c. Terminate if start-time of current segment is
-          earlier than ${DurationCompletedSegments} of start-time of last segment
+2. Bisect the directories (inspiral and ringdown separately) for tmin
+   and tmax.  The start-time of a segment (from DIR/Run/RestartTimes.txt)
+   is read only when bisection probes it, so besides the k segments in
+   the time-window only O(log n) segments are read.
+   This assumes increasing start-times within inspiral and ringdown.
 
 3. This routine does NOT yet look for joined segments, JLev${Lev}.  Should be simple to add
 JLev{$Lev} at start of list assembled in step 1., as long as CombineSegments also has combined Restart.txt
@@ -38,93 +110,410 @@ RETURNS
     if not os.path.isdir(EvDir):
         raise IOError("Directory {} does not exist".format(EvDir))
 
-    # find all segments
+    # find all segments.  Each chain (inspiral, ringdown) has increasing start-times
     tmp=os.path.join(EvDir,"Lev{}_*".format(Lev),'Run')
-    all_segments=sorted(glob.glob(tmp))
+    chains=[sorted(glob.glob(tmp))]
 
     if WithRingdown:
         tmp=os.path.join(EvDir,"Lev{}_Ringdown/Lev{}_*".format(Lev,Lev),'Run')
-        all_segments.extend(sorted(glob.glob(tmp)))
-
-
-    segments=[]
-    tstart=[]
-    term_reason=[]
-    tend=None
-    for seg in all_segments:
-        if seg[-7:]=='_AA/Run':
-            # first segment (inspiral or ringdown), where RestartTimes.txt
-            # is not reporting the initial start of the run
-            # take Evolution.input instead
-            tmp=os.path.join(seg,'Evolution.input')
-            if not os.path.exists(tmp):
-                raise IOError("{}--did not find Evolutiuon.input".format(seg))
-            p=re.compile("^ *StartTime *= *(.+); *\n")
-            for line in open(tmp):
-                m=p.match(line)
-                if m:
-                    #print("seg={}--p.group(1)={}".format(seg,p.group(1)))
-                    StartTime=float(m.group(1))
-            tmp=os.path.join(seg,'RestartTimes.txt')
-            if os.path.exists(tmp):
-                # if we've got restarts, use them for an approximate tend
-                restarts=np.loadtxt(tmp,
-                                    ndmin=1   # so it always returns an array
-                                    )
-                tend=restarts[-1]
-
-        else: # standard non-_AA segment
-            tmp=os.path.join(seg,'RestartTimes.txt')
-            if not os.path.exists(tmp):
-                raise IOError("{} not found--don't yet know how to handle this".format(tmp))
-            restarts=np.loadtxt(tmp,
-                                ndmin=1   # so it always returns an array
-                                )
-            StartTime=restarts[0]
-            # overwrite to find very last restart time
-            tend=restarts[-1]
-
-        tmp=os.path.join(seg,'TerminationReason.txt')
-        if os.path.exists(tmp):
-            with open(tmp, 'r') as myfile:
-                TerminationReason = myfile.readlines()[0]
-                prefix='Termination condition '
-                if TerminationReason.startswith(prefix):
-                    TerminationReason=TerminationReason[len(prefix):-1]
-        else:
-            TerminationReason='ongoing'
+        chains.append(sorted(glob.glob(tmp)))
+    all_segments=[seg for chain in chains for seg in chain]
+
+    # segments that have terminated do not change any more, so their
+    # start-time and TerminationReason can be taken from the cache
+    cache=cache_utils.GetCache(cache)
+    index_name='segments:{}:{}'.format(os.path.abspath(EvDir), Lev)
+    index={}
+    if cache is not None:
+        index=cache.get_index(index_name) or {}
+    n_known=len(index)
 
-        segments.append(seg)
-        tstart.append(StartTime)
-        #print("term_reason={}".format(term_reason))
-        #print("TerminationReason={}".format(TerminationReason))
-        term_reason.append(TerminationReason)
+    def ReadInfo(segs):
+        missing=[seg for seg in segs if seg not in index]
+        for seg, info in zip(missing, _MapSegments(_SegmentInfo, missing, workers=workers)):
+            index[seg]=info
 
     if tmin<0 and tmin!=-1e10:
-        if tend is None and len(tstart)==0:
+        if len(all_segments)==0:
             print('specified tmin<0, which requires an estimate for tend.')
             print('No such estimate could be obtained, b/c run too short.')
             print('Therefore, tmin will be ignored.')
         else:
-            tend=tstart[-1]  # use start of last segment as approx of end-time
+            ReadInfo(all_segments[-1:])
+            tend=index[all_segments[-1]][0]  # use start of last segment as approx of end-time
             tmin = tend+tmin
 
+    # bisect each chain for the time-window, then read the segments in it
     seg_=[]
     tstart_=[]
     term_reason_=[]
-    #print("tstart={}".format(tstart))
-    for s, t, r in zip(segments, tstart, term_reason):
-        #print(" --- tmin={},  t={},  tmax={}".format(tmin, t, tmax))
-        if t>tmin and t<tmax:
-            seg_.append(s)
-            tstart_.append(t)
-            term_reason_.append(r)
+    for chain in chains:
+        tstart=_StartTimes(chain, index, ReadInfo)
+        first=bisect.bisect_right(tstart, tmin)
+        last=bisect.bisect_left(tstart, tmax, lo=first)
+        selected=chain[first:last]
+        ReadInfo(selected)
+        seg_.extend(selected)
+        tstart_.extend(index[seg][0] for seg in selected)
+        term_reason_.extend(index[seg][1] for seg in selected)
+
+    if cache is not None and len(index)>n_known:
+        cache.put_index(index_name, {seg: info for seg, info in index.items()
+                                     if info[1]!='ongoing'})
     return seg_, tstart_,term_reason_
 
 
+class _StartTimes:
+    """Start-times of a chain of segments, as a sequence for bisect.
+The metadata of a segment is read with read([segment]) into 'index'
+when its start-time is first needed."""
+
+    def __init__(self, chain, index, read):
+        self.chain=chain
+        self.index=index
+        self.read=read
+
+    def __len__(self):
+        return len(self.chain)
+
+    def __getitem__(self, i):
+        seg=self.chain[i]
+        if seg not in self.index:
+            self.read([seg])
+        return self.index[seg][0]
+
+
+def _NewExecutor(executor, workers):
+    """Create a concurrent.futures pool of kind 'thread', 'process' or
+'pipeline' (see pipeline_utils.PipelineExecutor)"""
+    if executor=='thread':
+        return ThreadPoolExecutor(max_workers=workers)
+    if executor=='process':
+        return ProcessPoolExecutor(max_workers=workers)
+    if executor=='pipeline':
+        return PipelineExecutor(max_workers=workers)
+    raise ValueError("executor must be 'thread', 'process', 'pipeline' or an Executor, got {}".format(executor))
+
+
+def _UsePool(workers, executor):
+    """whether loaders with these options run on a pool.  A pipeline
+overlaps reading and parsing even with a single worker."""
+    return isinstance(executor, Executor) or executor=='pipeline' \
+        or (workers is not None and workers>1)
+
+
+def _MapSegments(func, args, workers=None, executor='thread', verbose=False, desc='',
+                 prefetch=False):
+    """Apply func to every element of args and return the results as a
+list in the order of args.  The calls are spread over a pool if
+workers>1, or if executor is an already running Executor.
+prefetch -- func(F, buf=content) accepts the content of the file F, so a
+            PipelineExecutor can read the files ahead"""
+    progress=lambda results: list(tqdm(results, total=len(args),
+                                       disable=not verbose, desc=f"{desc:15}"))
+    if isinstance(executor, PipelineExecutor) and prefetch:
+        return progress(executor.map_prefetched(func, args))
+    if isinstance(executor, Executor):
+        return progress(executor.map(func, args))
+    if not _UsePool(workers, executor):
+        return progress(map(func, args))
+    with _NewExecutor(executor, workers) as pool:
+        return _MapSegments(func, args, executor=pool, verbose=verbose, desc=desc,
+                            prefetch=prefetch)
+
+
+def _Profiled(load, F, buf=None):
+    """load(F, timing=timing, buf=buf), returning the result and the dictionary
+'timing' with its statistics and wall-time.  Runs in the workers of the
+loaders if profiling is enabled."""
+    timing={}
+    t0=time.perf_counter()
+    result=load(F, timing=timing, buf=buf)
+    timing['wall']=time.perf_counter()-t0
+    return result, timing
+
+
+def _RecordReads(profile, filename, segments, results):
+    """Add 'read' records of the (result, timing) pairs returned by
+_Profiled to the profile_utils.ImportProfile 'profile', and return the results"""
+    out=[]
+    for seg,(tmp,timing) in zip(segments, results):
+        if tmp is not None:
+            profile.record('read', filename, segment=seg,
+                           cached=timing.pop('cached', 'parse' not in timing), **timing)
+        out.append(tmp)
+    return out
+
+
+def _MergeSegment(D, tmp):
+    """Append the data of one segment (recursive dictionary tmp) to D.
+Arrays already present in D are collected into a ColumnBuffer, call
+_Materialize(D) when all segments are merged."""
+    for k,data in tmp.items():
+        if isinstance(data, dict):
+            if k not in D:
+                D[k]={}
+            _MergeSegment(D[k], data)
+        elif isinstance(data, LegendColumns):
+            if k in D:
+                D[k].extend(data)
+            else:
+                D[k]=data
+        elif k in D:
+            if not isinstance(D[k], ColumnBuffer):
+                D[k]=ColumnBuffer([D[k]])
+            D[k].append(data)
+        else:
+            D[k]=data
+    return D
+
+
+def _Materialize(D, stitch=False, views=False):
+    """Replace the ColumnBuffers in the recursive dictionary D by arrays,
+and LegendColumns by dictionaries.
+stitch -- if True, drop rows of each segment that overlap later segments,
+          see column_utils.StitchRows
+views  -- if True, legends are read-only views, see LegendColumns.dict"""
+    for k,data in D.items():
+        if isinstance(data, dict):
+            _Materialize(data, stitch=stitch, views=views)
+        elif isinstance(data, (ColumnBuffer, LegendColumns)):
+            if stitch:
+                data.stitch()
+            D[k]=data.array() if isinstance(data, ColumnBuffer) else data.dict(views=views)
+    return D
+
+
+def _StitchLegends(parts):
+    """Stitch consecutive dictionaries legend -> (N,2) array of one .dat
+file in place, see column_utils.StitchRows.  The cut-off is the same for
+all legends, since they share the time column of the file."""
+    first=[min((data[0,0] for data in part.values() if len(data)>0), default=np.inf)
+           for part in parts]
+    for part,cutoff in zip(parts, StitchCutoffs(first)):
+        for legend,data in part.items():
+            part[legend]=data[:np.searchsorted(data[:,0], cutoff, side='left')]
+    return parts
+
+
+def _Rows(D):
+    """Recursive dictionary with the number of rows of every array in D"""
+    rows={}
+    for k,data in D.items():
+        if isinstance(data, dict):
+            rows[k]=_Rows(data)
+        elif isinstance(data, LegendColumns):
+            rows[k]=data.rows()
+        else:
+            rows[k]=len(data)
+    return rows
+
+
+def _Truncate(D, rows):
+    """Shorten the arrays in D to the lengths recorded with _Rows, and
+drop entries that did not exist at that time"""
+    for k in list(D.keys()):
+        if k not in rows:
+            del D[k]
+        elif isinstance(D[k], dict):
+            _Truncate(D[k], rows[k])
+        else:
+            D[k]=D[k][:rows[k]]
+    return D
+
+
+class _TimeColumn:
+    """Column 0 (time) of an h5 data-set as a sequence for bisect.
+Every access reads a single element, i.e. only the chunk containing it."""
+    def __init__(self, dataset):
+        self.dataset=dataset
+
+    def __len__(self):
+        return self.dataset.shape[0]
+
+    def __getitem__(self, i):
+        return self.dataset[i,0]
+
+
+def _ReadTimeRange(dataset, tmin=None, tmax=None):
+    """Read the rows of an h5 data-set with tmin <= t <= tmax.  The rows are
+located by binary search on the time column, which has to increase,
+and then read as one hyperslab."""
+    if (tmin is None and tmax is None) or dataset.ndim!=2:
+        return dataset[()]
+    t=_TimeColumn(dataset)
+    first=0 if tmin is None else bisect.bisect_left(t, tmin)
+    last=len(t) if tmax is None else bisect.bisect_right(t, tmax)
+    return dataset[first:max(first,last)]
+
+
+def _PlanH5(group, dataset_re, group_re):
+    """Walk the open h5 group (or file) once, and decide which data-sets
+to load and which sub-groups to descend into.
+
+RETURNS plan=(keys, items)
+  keys  -- all keys of the group, to recognize a group with different structure
+  items -- list of (key, field, subplan), subplan is None for data-sets"""
+    keys=tuple(group.keys())
+    top=group.name=='/'
+    items=[]
+    for k in keys:
+        name=group.name.rstrip('/')+'/'+k
+        if k.endswith('.dat') and \
+           (dataset_re.match(name)
+            or top # always keep top-level .dat fields
+           ):
+            field=k[:-4]  # remove extension from name for convenience
+            items.append((k, field, None))
+        if k.endswith('.dir') and group_re.match(name):
+            field=k[:-4]
+            items.append((k, field, _PlanH5(group[k], dataset_re, group_re)))
+    return keys, items
+
+
+def _LoadPlannedH5(group, plan, D, tmin=None, tmax=None):
+    """Given the open H5-file handle 'group' (either representing the file,
+or a group inside the file), load the data-sets selected by 'plan' (see
+_PlanH5) and store them as elements in the dictionary D.  Data-sets
+with a legend become LegendColumns, groups become sub-dictionaries.
+
+RETURNS False if the structure of 'group' differs from the plan."""
+    keys, items=plan
+    if tuple(group.keys())!=keys:
+        return False
+    for k, field, subplan in items:
+        obj=group[k]
+        if subplan is not None:
+            if field not in D:
+                D[field]={}
+            if not _LoadPlannedH5(obj, subplan, D[field], tmin=tmin, tmax=tmax):
+                return False
+            continue
+        data=_ReadTimeRange(obj, tmin, tmax)
+        attrs=obj.attrs
+        if 'Legend' in attrs:
+            # a legend was provided for this data-set, split
+            # the dataset into individual entries, and put
+            # into a dictionary indexed by legend:
+            legends={}
+            for i,legend in enumerate(attrs['Legend']):
+                # decode if not already a plain python str
+                if not type(legend)==type(str("abc")):
+                    legend=legend.decode("utf-8")
+                legends[legend]=i
+            _MergeSegment(D, {field: LegendColumns(legends, data)})
+        else:
+            # no legend for this data-set.  Load as one big array
+            _MergeSegment(D, {field: data})
+    return True
+
+
+def _PlanH5File(F, dataset_matches='', group_matches=''):
+    """_PlanH5 for the file F, None if the file does not exist"""
+    if not os.path.exists(F):
+        return None
+    with h5py.File(F,'r') as H5:
+        return _PlanH5(H5, re.compile(dataset_matches), re.compile(group_matches))
+
+
+def _LoadH5_raw(F, dataset_matches='', group_matches='', tmin=None, tmax=None,
+                plan=None, buf=None):
+    """Load one h5 file as recursive dictionary, with data-sets that
+have a legend as LegendColumns.  None if the file does not exist.
+plan -- result of _PlanH5 for a file with the same structure (e.g. the
+        same file in an earlier segment).  The file is walked again only
+        if its structure turns out to be different.
+buf  -- content of F, if it was already read"""
+    if buf is None and not os.path.exists(F):
+        return None
+    with h5py.File(F if buf is None else io.BytesIO(buf),'r') as H5:
+        if plan is not None:
+            D={}
+            if _LoadPlannedH5(H5, plan, D, tmin=tmin, tmax=tmax):
+                return D
+        plan=_PlanH5(H5, re.compile(dataset_matches), re.compile(group_matches))
+        D={}
+        _LoadPlannedH5(H5, plan, D, tmin=tmin, tmax=tmax)
+    return D
+
+
+def LoadH5(F, dataset_matches='', group_matches='', cache=None,
+           tmin=None, tmax=None):
+    """
+Load one h5 file and provide it as recursive dictionary.
+Returns None if the file does not exist.
+
+  F -- filename
+  dataset_matches, group_matches, tmin, tmax -- see LoadH5_from_segments
+  cache -- cache_utils.SegmentCache (or its directory) to take
+           the parsed file from, if present and F is unchanged
+"""
+    if not os.path.exists(F):
+        return None
+    cache=cache_utils.GetCache(cache)
+    if cache is not None:
+        load=functools.partial(LoadH5, dataset_matches=dataset_matches,
+                               group_matches=group_matches, tmin=tmin, tmax=tmax)
+        return cache.load(F, load, tag=_H5Tag(dataset_matches, group_matches, tmin, tmax))
+    return _Materialize(_LoadH5_raw(F, dataset_matches=dataset_matches,
+                                    group_matches=group_matches, tmin=tmin, tmax=tmax))
+
+
+def _H5Tag(dataset_matches, group_matches, tmin, tmax):
+    """cache tag of LoadH5"""
+    return 'h5:{}:{}:{}:{}'.format(dataset_matches, group_matches, tmin, tmax)
+
+
+def _LoadH5_segment(F, dataset_matches='', group_matches='', cache=None,
+                    tmin=None, tmax=None, plan=None, timing=None, buf=None):
+    """Load one h5 file for LoadH5_from_segments.  Without cache, data-sets
+with legends are kept as LegendColumns, so that segments can be joined
+without copying every legend.
+timing -- if a dict, the rows and bytes read are stored in it
+buf    -- content of F, if it was already read (not used with cache)"""
+    t0=time.perf_counter()
+    if cache is None:
+        D=_LoadH5_raw(F, dataset_matches=dataset_matches,
+                      group_matches=group_matches, tmin=tmin, tmax=tmax,
+                      plan=plan, buf=buf)
+        if timing is not None:
+            timing['cached']=False
+    elif timing is None:
+        D=LoadH5(F, dataset_matches=dataset_matches,
+                 group_matches=group_matches, cache=cache, tmin=tmin, tmax=tmax)
+    else:
+        def load(F):
+            timing['cached']=False
+            return LoadH5(F, dataset_matches=dataset_matches,
+                          group_matches=group_matches, tmin=tmin, tmax=tmax)
+        timing['cached']=True
+        D=None
+        if os.path.exists(F):
+            D=cache.load(F, load, tag=_H5Tag(dataset_matches, group_matches, tmin, tmax))
+    if timing is not None and D is not None:
+        if not timing['cached']:
+            timing['read']=time.perf_counter()-t0
+        timing['rows'],timing['bytes']=_Size(D)
+    return D
+
+
+def _Size(D):
+    """total rows and bytes of the arrays in the recursive dictionary D"""
+    rows,nbytes=0,0
+    for data in D.values():
+        if isinstance(data, dict):
+            r,b=_Size(data)
+        else:
+            r,b=len(data),data.nbytes
+        rows+=r
+        nbytes+=b
+    return rows,nbytes
+
 
 def LoadH5_from_segments(segments, filename, dataset_matches='',group_matches='',
-                         verbose=False):
+                         verbose=False, workers=None, executor='thread', cache=None,
+                         state=None, tmin=None, tmax=None, profile=None, stitch=True,
+                         views=False):
     """
 Given a list of segments (incl. '/Run' directories),
 check each one for a file 'filename', load that h5 file, concatenate data, and
@@ -134,74 +523,170 @@ OPTIONS:
    dataset_matches=[regex] -- only load data-sets matching the regex (e.g. 'Y_l2_m2')
                               Note:  root-datasets are always loaded
    group_matches=[regex]   -- only traverse groups matching this regex (e.g. 'R0200')
+   tmin, tmax              -- only read rows with tmin <= t <= tmax.  The matching
+                              rows of each data-set are found by binary search on
+                              its time column, and read as one slice.
+   workers, executor       -- read segments on a pool of 'workers' threads
+                              (executor='thread') or processes ('process'),
+                              or on an already running concurrent.futures.Executor.
+                              executor='pipeline' reads whole files ahead while
+                              others are parsed, see pipeline_utils
+   cache                   -- cache_utils.SegmentCache (or its directory) for
+                              parsed files, so unchanged segments are not re-read
+   state                   -- if a dict is given, it is filled with the bookkeeping
+                              RefreshRun needs to extend the result later
+   profile                 -- profile_utils.ImportProfile collecting the time spent
+                              on each file
+   stitch                  -- if True, where a segment overlaps the next one (it was
+                              restarted from a checkpoint), keep the data of the newer
+                              segment only, so the time of each data-set is strictly
+                              increasing (see column_utils.StitchRows)
+   views                   -- if True, the arrays of a data-set with legend are
+                              read-only views into one block, which shares the
+                              time column (see column_utils.LegendColumns.dict)
 """
+    t0=time.perf_counter()
+    desc=filename.split('/')[-1]
+    files=[os.path.join(seg,filename) for seg in segments]
+    cache=cache_utils.GetCache(cache)
+    # decide once which data-sets and groups to load, and re-use
+    # this for all segments with the same file structure
+    plan=None
+    if cache is None:
+        for f in files:
+            plan=_PlanH5File(f, dataset_matches=dataset_matches,
+                             group_matches=group_matches)
+            if plan is not None:
+                break
+    load=functools.partial(_LoadH5_segment, dataset_matches=dataset_matches,
+                           group_matches=group_matches,
+                           cache=cache, tmin=tmin, tmax=tmax, plan=plan)
+    if profile is not None:
+        load=functools.partial(_Profiled, load)
+    D={}
+    # whole files are only read ahead if all of them is loaded
+    prefetch=cache is None and tmin is None and tmax is None \
+             and dataset_matches=='' and group_matches==''
+    results=_MapSegments(load, files, workers=workers, executor=executor,
+                         verbose=verbose, desc=desc, prefetch=prefetch)
+    if profile is not None:
+        results=_RecordReads(profile, filename, segments, results)
+    t1=time.perf_counter()
+    for i,tmp in enumerate(results):
+        if state is not None and i==len(results)-1:
+            # the last segment may still grow.  Remember where its data
+            # starts, so that RefreshRun can replace it.
+            state['rows']=_Rows(D)
+        if tmp is not None:
+            _MergeSegment(D, tmp)
+    _Materialize(D, stitch=stitch, views=views)
+    if profile is not None:
+        t2=time.perf_counter()
+        profile.record('concat', filename, wall=t2-t1)
+        profile.record('loader', filename, wall=t2-t0)
+    return D
 
-    # helper function for iterative loading
-    def LoadFromOpenH5(F, D,dataset_matches='',group_matches=''):
-        """Given the open H5-file handle F
-        (either representing the file, or a group inside the file),
-        load all .dat files and store them as elements in the
-        directory D.  Recursively descend into each .dir,
-        and add those as sub-dictionaries into D
-        dataset_matches=[regex] -- only load data-sets matching the regex"""
-
-        for k in F.keys():
-            if k.endswith('.dat') and \
-            (re.match(dataset_matches,F[k].name)
-             or F.parent==F # always keep top-level .dat fields
-            ):
-                field=k[:-4]  # remove extension from name for convenience
-                data=F[k][()]
-                if 'Legend' in F[k].attrs:
-                    # a legend was provided for this data-set, split
-                    # the dataset into individual entries, and put
-                    # into a dictionary indexed by legend:
-                    if not field in D:
-                        D[field]={}
-                    for i,legend in enumerate(F[k].attrs['Legend']):
-                        # decode if not already a plain python str
-                        if not type(legend)==type(str("abc")):
-                            legend=legend.decode("utf-8")
-                        if legend in D[field]:
-                            D[field][legend]=np.concatenate((D[field][legend],
-                                                             data[:,[0,i]]))
-                        else:
-                            D[field][legend]=data[:,[0,i]]
-                else:
-                    # no legend for this data-set.  Load as one big array
-                    if field in D:
-                        D[field]=np.concatenate((D[field], data))
-                    else:
-                        D[field]=data
-            if k.endswith('.dir') and re.match(group_matches,F[k].name):
-                field=k[:-4]
-                if field not in D:
-                    D[field]={}
-                LoadFromOpenH5(F[k],D[field],
-                               dataset_matches=dataset_matches,
-                               group_matches=group_matches)
-        return
 
-    D={}
-    n_files=0
-    desc=filename.split('/')[-1]
-    for seg in tqdm(segments, disable=not verbose, desc=f"{desc:15}"):
-        #print(".",end="")
-        f=os.path.join(seg,filename)
-        if os.path.exists(f):
-            F=h5py.File(f,'r')
-            LoadFromOpenH5(F,D,
-                           dataset_matches=dataset_matches,
-                           group_matches=group_matches)
-            F.close()
-            n_files=n_files+1
-    #if verbose and n_files < len(segments):
-    #    print(f"file is not present in {len(segments)-n_files} segments")
+
+def _SegmentStart(segments, tstart):
+    """start-times of the segments, read from the segments if tstart is None"""
+    if tstart is None:
+        return [_SegmentInfo(seg)[0] for seg in segments]
+    return tstart
+
+
+def _TrimRows(D, cutoff):
+    """Drop the rows at and after the time 'cutoff' from the arrays in the
+recursive dictionary D, in place.  cutoff is one time for all of D, or a
+recursive dictionary of times like D; arrays without entry are kept whole."""
+    for k,data in D.items():
+        c=cutoff.get(k, np.inf) if isinstance(cutoff, dict) else cutoff
+        if isinstance(data, dict):
+            _TrimRows(data, c)
+        elif not isinstance(c, dict) and c<np.inf and \
+             isinstance(data, np.ndarray) and data.ndim==2 and data.shape[1]>0:
+            D[k]=data[:np.searchsorted(data[:,0], c, side='left')]
     return D
 
 
+def _FirstH5Times(group, plan, tmin=None, tmax=None):
+    """Recursive dictionary with the first time in [tmin, tmax] of each
+2-d data-set selected by 'plan' (see _PlanH5), inf if it has no rows there"""
+    out={}
+    for k, field, subplan in plan[1]:
+        obj=group[k]
+        if subplan is not None:
+            out[field]=_FirstH5Times(obj, subplan, tmin=tmin, tmax=tmax)
+        elif obj.ndim==2 and obj.shape[1]>0:
+            t=_TimeColumn(obj)
+            i=0 if tmin is None else bisect.bisect_left(t, tmin)
+            out[field]=t[i] if i<len(t) and (tmax is None or t[i]<=tmax) else np.inf
+    return out
 
-def LoadDat_from_segments_simple(segments, filename, verbose=False):
+
+def _MinTimes(a, b):
+    """element-wise minimum of two recursive dictionaries of times"""
+    out=dict(a)
+    for k,t in b.items():
+        if k not in out:
+            out[k]=t
+        elif isinstance(t, dict) and isinstance(out[k], dict):
+            out[k]=_MinTimes(out[k], t)
+        elif not isinstance(t, dict) and not isinstance(out[k], dict):
+            out[k]=min(out[k], t)
+    return out
+
+
+def IterH5_from_segments(segments, filename, dataset_matches='', group_matches='',
+                         tstart=None, cache=None, tmin=None, tmax=None, stitch=True):
+    """
+Generator variant of LoadH5_from_segments, which loads one segment at
+a time.  Memory use is bounded by the size of one segment's file, so
+reductions over runs that do not fit into memory are possible, see
+stream_utils.
+
+tstart -- start-times of the segments, as returned by FindLatestSegments.
+          If None, they are read from the segments.
+stitch -- if True, drop the rows of each segment that are superseded by
+          later segments, as LoadH5_from_segments does.  The first time
+          of every data-set of the later segments is read beforehand.
+Other options as for LoadH5_from_segments.
+
+YIELDS (segment, tstart, D) for each segment containing 'filename',
+       D being the recursive dictionary of this segment's data
+"""
+    cache=cache_utils.GetCache(cache)
+    segments=[(seg, t) for seg,t in zip(segments, _SegmentStart(segments, tstart))
+              if os.path.exists(os.path.join(seg,filename))]
+    cutoffs=[{}]*len(segments)
+    if stitch:
+        later={}
+        for i in reversed(range(len(segments))):
+            cutoffs[i]=later
+            with h5py.File(os.path.join(segments[i][0],filename),'r') as H5:
+                plan=_PlanH5(H5, re.compile(dataset_matches), re.compile(group_matches))
+                later=_MinTimes(later, _FirstH5Times(H5, plan, tmin=tmin, tmax=tmax))
+    plan=None
+    for (seg,t),cutoff in zip(segments, cutoffs):
+        f=os.path.join(seg,filename)
+        if plan is None and cache is None:
+            plan=_PlanH5File(f, dataset_matches=dataset_matches,
+                             group_matches=group_matches)
+        tmp=_LoadH5_segment(f, dataset_matches=dataset_matches,
+                            group_matches=group_matches, cache=cache,
+                            tmin=tmin, tmax=tmax, plan=plan)
+        yield seg, t, _TrimRows(_Materialize(tmp), cutoff)
+
+
+def _LoadDat_simple(F):
+    """np.loadtxt of one file, None if the file does not exist"""
+    if not os.path.exists(F):
+        return None
+    return np.loadtxt(F)
+
+
+def LoadDat_from_segments_simple(segments, filename, verbose=False,
+                                 workers=None, executor='thread'):
     """
 Given a list of segments (incl. '/Run' directories),
 check each one for a file 'filename', load that dat file, concatenate data, and
@@ -210,25 +695,50 @@ provide as np.array
 Note: This function requires that the .dat file in all segments has
 same number of columns
     """
-    out=None
-    n_files=0
+    out=ColumnBuffer()
     desc=filename.split('/')[-1]
-    for seg in tqdm(segments, disable=not verbose, desc=f"{desc:15}"):
-        f=os.path.join(seg,filename)
-        if os.path.exists(f):
-            tmp=np.loadtxt(f)
-            if len(tmp.shape)==2: # ?? not sure why
-                if out is None:
-                    out=tmp
-                else:
-                    out=np.concatenate((out,tmp))
-            n_files+=1
-    #if verbose and n_files < len(segments):
-    #    print(f"file is not present in {len(segments)-n_files} segments")
-    return out
+    files=[os.path.join(seg,filename) for seg in segments]
+    for tmp in _MapSegments(_LoadDat_simple, files, workers=workers,
+                            executor=executor, verbose=verbose, desc=desc):
+        if tmp is not None and len(tmp.shape)==2: # ?? not sure why
+            out.append(tmp)
+    return out.array()
+
+
+# legend lines of SpEC .dat files, e.g. '# [2] = ArealMass'
+_legend_re=re.compile(rb"^# *\[([0-9]+)\] * = *(.+)\n", re.MULTILINE)
+
+
+def _ParseDat(buf):
+    """Parse the content 'buf' (bytes) of a .dat file, which was read
+in one go.  The legend is taken from the leading comment lines only,
+the remainder is converted with np.loadtxt, which rejects ragged rows.
+
+RETURNS
+  keys -- dictionary int -> legend string (1-based column index)
+  data -- 2-d np.array"""
+    # skip over the header
+    pos=0
+    while buf.startswith(b'#', pos):
+        pos=buf.find(b'\n', pos)+1
+        if pos==0:
+            pos=len(buf)
+    body=buf[pos:]
+    if b'#' in body:
+        # comments between the data, which may hold legends as well
+        pos=len(buf)
+    keys={int(m.group(1)): m.group(2).decode("utf-8").strip()
+          for m in _legend_re.finditer(buf, 0, pos)}
+    if len(body.strip())==0:
+        # header only, e.g. a file just created by a new segment
+        return keys, np.zeros((0, max(keys.keys(), default=1)))
+    data=np.loadtxt(io.BytesIO(body),
+                    ndmin=2 # always return a 2-d array
+                   )
+    return keys, data
 
 
-def LoadDat_with_legend(F):
+def LoadDat_with_legend(F, cache=None):
     """
 Load a .dat file with standard SpEC legend strings.
 Results will be placed into a dictionary indexed by the
@@ -236,33 +746,248 @@ legend string.  This allows to import files where the columns
 change between segments.
 
 F -- filename
+cache -- cache_utils.SegmentCache (or its directory) to take
+         the parsed file from, if present and F is unchanged
 
 RETURNS
   D -- dictionary
 """
     if not os.path.isfile(F):
         raise IOError("File {} not found".format(F))
+    return _LoadDat_segment(F, cache=cache).dict()
 
-    # parse legend portion of file, construct legend as dictionary 'keys'
-    keys={}   # dictonary of keys:  int -> legend string
-    p=re.compile("^# *\[([0-9]+)\] * = *(.+)\n")
-    for line in open(F):
-        m=p.match(line)
-        if m is not None:
-            #print("{}  -{}-".format(m.group(1), m.group(2)))
-            keys[ int( m.group(1) )]  = m.group(2).strip()
-    #print(keys)
-    tmp=np.loadtxt(F,
-                   ndmin=2 # always return a 2-d array
-                  )
-    #print(tmp.shape)
-    D={}
-    for idx,legend in keys.items():
-        D[legend]=tmp[:,[0,idx-1]]  # -1, since SpEC legends are 1-based
-    return D
+
+def LoadDat_tail(F, offset=0):
+    """
+Load the lines of a .dat file with standard SpEC legend strings,
+that were appended after byte 'offset'.  Only complete lines are
+parsed, so this can be used on files that are still being written.
+
+F      -- filename
+offset -- byte offset to start from, as returned by an earlier call
+
+RETURNS
+  D      -- dictionary as in LoadDat_with_legend, empty if no new lines
+  offset -- byte offset up to which the file was parsed
+"""
+    if not os.path.isfile(F):
+        raise IOError("File {} not found".format(F))
+    tmp, offset=_ReadDatTail(F, offset)
+    if tmp is None:
+        return {}, offset
+    return tmp.dict(), offset
 
 
-def LoadDat_from_segments(segments, filename, verbose=False):
+def _ReadDatTail(F, offset):
+    """LoadDat_tail, but returning the data as LegendColumns (or None)"""
+    with open(F,'rb') as f:
+        header=b''
+        for line in f:
+            if not line.startswith(b'#'):
+                break
+            header=header+line
+        f.seek(offset)
+        buf=f.read()
+    buf=buf[:buf.rfind(b'\n')+1]   # drop an incomplete last line
+    keys,_=_ParseDat(header)
+    _,data=_ParseDat(buf)
+    if len(data)==0:
+        return None, offset+len(buf)
+    # -1, since SpEC legends are 1-based
+    legends={legend: idx-1 for idx,legend in keys.items()}
+    return LegendColumns(legends, data), offset+len(buf)
+
+
+def _ReadDatHeader(F):
+    """Legend of a .dat file, as dictionary int -> legend string,
+reading only the leading comment lines"""
+    header=b''
+    with open(F,'rb') as f:
+        for line in f:
+            if not line.startswith(b'#'):
+                break
+            header=header+line
+    keys,_=_ParseDat(header)
+    return keys
+
+
+def _ReadDatBlock(F, timing=None, buf=None):
+    """All columns of a .dat file as one 2-d array 'data', together with
+the 'legends' and their 0-based 'columns', in a dictionary so it can be
+stored in a SegmentCache.
+timing -- if a dict, the time for reading and parsing, and the bytes
+          and rows read are stored in it
+buf    -- content of F, if it was already read"""
+    t0=time.perf_counter()
+    if buf is None:
+        with open(F,'rb') as f:
+            buf=f.read()
+    t1=time.perf_counter()
+    try:
+        keys, data=_ParseDat(buf)
+    except ValueError:
+        # file is being written, ignore the incomplete last line
+        keys, data=_ParseDat(buf[:buf.rfind(b'\n')+1])
+    if timing is not None:
+        timing.update(read=t1-t0, parse=time.perf_counter()-t1,
+                      bytes=len(buf), rows=len(data))
+    # -1, since SpEC legends are 1-based
+    return {'data': data,
+            'legends': np.array(list(keys.values()), dtype=str),
+            'columns': np.array([idx-1 for idx in keys.keys()], dtype=int)}
+
+
+class LazyDat(Mapping):
+    """
+Dictionary-like result of LoadDat_from_segments(..., lazy=True).
+
+On construction, only the legends of the .dat file in each segment are
+read.  The (time, value) array of a legend is read and concatenated
+across segments when it is first accessed, and kept afterwards.  Only
+these arrays are kept, not the parsed files, so memory scales with the
+legends actually used.  load(legends) reads several legends with a
+single pass over the files.
+
+previous -- LazyDat of the same file in an earlier list of segments, e.g.
+            before RefreshRun.  Its legends and arrays are re-used for
+            the leading files that did not change since.
+"""
+
+    def __init__(self, files, cache=None, stitch=True, previous=None):
+        self._files=[f for f in files if os.path.exists(f)]
+        self._cache=cache_utils.GetCache(cache)
+        self._signature=[_FileSignature(f) for f in self._files]
+        # number of leading files unchanged since 'previous'
+        same=0
+        if previous is not None:
+            for f,sig,pf,psig in zip(self._files, self._signature,
+                                     previous._files, previous._signature):
+                if f!=pf or sig!=psig:
+                    break
+                same+=1
+        # legend -> 1-based column index, and time of the first row, for each file
+        self._legends=[]
+        self._first=[]
+        for i,f in enumerate(self._files):
+            if i<same:
+                self._legends.append(previous._legends[i])
+                self._first.append(previous._first[i])
+            else:
+                self._legends.append({legend: idx for idx,legend in _ReadDatHeader(f).items()})
+                self._first.append(_FirstDatTime(f))
+        # time from which on the data of each file is superseded by later files
+        self._cutoff=StitchCutoffs(self._first) if stitch \
+                     else np.full(len(self._files), np.inf)
+        # all legends, in order of first appearance
+        self._keys=dict.fromkeys(legend for legends in self._legends
+                                 for legend in legends)
+        # legend -> (array, rows before the data of each file, number of files read)
+        self._columns={}
+        if same>0:
+            for legend,(column, starts, nfiles) in previous._columns.items():
+                n=min(same, nfiles)
+                # the rows of the first n files, stitched against the later files
+                end=min(starts[n], int(np.searchsorted(column[:starts[n],0],
+                                                       self._cutoff[n-1], side='left')))
+                self._columns[legend]=(column[:end], np.minimum(starts[:n+1], end), n)
+
+    def _block(self, F):
+        if self._cache is None:
+            return _ReadDatBlock(F)['data']
+        return self._cache.load(F, _ReadDatBlock, tag='datblock')['data']
+
+    def load(self, legends):
+        """Read the arrays of several legends, parsing each file at most once"""
+        todo={}   # legend -> first file to read
+        for legend in legends:
+            if legend not in self._keys:
+                raise KeyError(legend)
+            column=self._columns.get(legend)
+            if column is None:
+                todo[legend]=0
+            elif column[2]<len(self._files):
+                todo[legend]=column[2]
+        if len(todo)==0:
+            return
+        pieces={legend: [] for legend in todo}
+        for i in range(min(todo.values()), len(self._files)):
+            need=[legend for legend,start in todo.items()
+                  if start<=i and legend in self._legends[i]]
+            if len(need)==0:
+                continue
+            block=self._block(self._files[i])
+            block=block[:np.searchsorted(block[:,0], self._cutoff[i], side='left')]
+            for legend in need:
+                # copy, so that the parsed file is not kept alive
+                # -1, since SpEC legends are 1-based
+                pieces[legend].append((i, np.array(LegendView(block, self._legends[i][legend]-1))))
+        for legend,start in todo.items():
+            lengths=np.zeros(len(self._files)-start, dtype=int)
+            for i,piece in pieces[legend]:
+                lengths[i-start]=len(piece)
+            if start>0:
+                column, starts, nfiles=self._columns[legend]
+                arrays=[column]
+            else:
+                starts=np.zeros(1, dtype=int)
+                arrays=[]
+            arrays+=[piece for i,piece in pieces[legend]]
+            column=arrays[0] if len(arrays)==1 else np.concatenate(arrays)
+            starts=np.concatenate([starts, starts[-1]+np.cumsum(lengths)])
+            self._columns[legend]=(column, starts, len(self._files))
+
+    def __getitem__(self, legend):
+        self.load([legend])
+        return self._columns[legend][0]
+
+    def __contains__(self, legend):
+        return legend in self._keys
+
+    def __iter__(self):
+        return iter(self._keys)
+
+    def __len__(self):
+        return len(self._keys)
+
+
+def _FileSignature(F):
+    """modification time and size of F, to recognize changed files"""
+    st=os.stat(F)
+    return st.st_mtime_ns, st.st_size
+
+
+def _FirstDatTime(F):
+    """time of the first row of a .dat file, inf if it has no rows"""
+    with open(F, 'rb') as f:
+        for line in f:
+            line=line.strip()
+            if line and not line.startswith(b'#'):
+                return float(line.split()[0])
+    return np.inf
+
+
+def _LoadDat_segment(F, cache=None, timing=None, buf=None):
+    """Load one .dat file as LegendColumns, None if the file does not exist.
+timing -- if a dict, statistics of reading the file are stored in it
+buf    -- content of F, if it was already read"""
+    if buf is None and not os.path.exists(F):
+        return None
+    if cache is None:
+        block=_ReadDatBlock(F, timing=timing, buf=buf)
+    else:
+        block=cache_utils.GetCache(cache).load(
+            F, functools.partial(_ReadDatBlock, timing=timing, buf=buf), tag='datblock')
+        if timing is not None:
+            timing.setdefault('rows', len(block['data']))
+    legends={str(legend): int(column)
+             for legend, column in zip(block['legends'], block['columns'])}
+    return LegendColumns(legends, block['data'])
+
+
+def LoadDat_from_segments(segments, filename, verbose=False,
+                          workers=None, executor='thread', cache=None, state=None,
+                          lazy=False, profile=None, table=False, stitch=True,
+                          views=False):
     """Given a list of segments (incl. '/Run' directories), check each
 one for a file 'filename', and load the data from it.  Concatenates
 data from different segments, and returns a a dictionary with 2-column
@@ -270,37 +995,127 @@ data-sets, one each for each column, named by the legend's inside the
 .dat files.  This allows for .dat files with a changing number of
 columns, like GhCe_Linf.dat
 
+workers, executor -- read segments on a pool of 'workers' threads
+                     (executor='thread') or processes ('process'),
+                     or on an already running concurrent.futures.Executor.
+                     executor='pipeline' reads files ahead while others
+                     are parsed, see pipeline_utils
+cache             -- cache_utils.SegmentCache (or its directory) for parsed
+                     files, so unchanged segments are not re-read
+state             -- if a dict is given, it is filled with the bookkeeping
+                     RefreshRun needs to extend the result later
+lazy              -- if True, return a LazyDat, which reads the data of
+                     each legend only when it is accessed
+profile           -- profile_utils.ImportProfile collecting the time spent
+                     on each file (not with lazy=True)
+table             -- if True, return a column_utils.RunTable, with one shared
+                     time index for all legends (ignored with lazy=True)
+stitch            -- if True, where a segment overlaps the next one (it was
+                     restarted from a checkpoint), keep the rows of the newer
+                     segment only, so that time is strictly increasing
+                     (see column_utils.StitchRows)
+views             -- if True, the arrays are read-only views into one block
+                     per file, which share the time column and are not
+                     copied (see column_utils.LegendColumns.dict)
+
 RETURNS
   D -- dictionary
 
     """
-    D={}
-
-    n_files=0
+    if lazy:
+        return LazyDat([os.path.join(seg,filename) for seg in segments], cache=cache,
+                       stitch=stitch)
+    t0=time.perf_counter()
+    out=LegendColumns()
     desc=filename.split('/')[-1]
-    for seg in tqdm(segments,disable=not verbose, desc=f"{desc:15}"):
-        f=os.path.join(seg,filename)
-        if os.path.exists(f):
-            tmp=LoadDat_with_legend(f)
-            for legend, data in tmp.items():
-                if legend in D:
-                    D[legend]=np.concatenate((D[legend], data))
-                else:
-                    D[legend]=data
-            n_files+=1
-    #if verbose and n_files < len(segments):
-    #    print(f"file is not present in {len(segments)-n_files} segments")
+    files=[os.path.join(seg,filename) for seg in segments]
+    if state is not None and len(files)>0:
+        # the last segment may still grow.  Read it separately, and
+        # remember up to which byte, so RefreshRun can continue from there.
+        files, last=files[:-1], files[-1]
+    load=functools.partial(_LoadDat_segment, cache=cache_utils.GetCache(cache))
+    if profile is not None:
+        load=functools.partial(_Profiled, load)
+    results=_MapSegments(load, files, workers=workers, executor=executor,
+                         verbose=verbose, desc=desc, prefetch=cache is None)
+    if profile is not None:
+        results=_RecordReads(profile, filename, segments, results)
+    if state is not None:
+        state['offset']=0
+        if len(segments)>0 and os.path.exists(last):
+            t1=time.perf_counter()
+            tmp, state['offset']=_ReadDatTail(last, 0)
+            results.append(tmp)
+            if profile is not None and tmp is not None:
+                profile.record('read', filename, segment=segments[-1],
+                               wall=time.perf_counter()-t1, bytes=state['offset'],
+                               rows=len(tmp), cached=False)
+    t1=time.perf_counter()
+    for tmp in results:
+        if tmp is not None:
+            out.extend(tmp)
+    if stitch:
+        out.stitch()
+    D=RunTable.from_legend_columns(out) if table else out.dict(views=views)
+    if profile is not None:
+        t2=time.perf_counter()
+        profile.record('concat', filename, wall=t2-t1)
+        profile.record('loader', filename, wall=t2-t0)
     return D
 
 
+def IterDat_from_segments(segments, filename, tstart=None, cache=None, stitch=True):
+    """
+Generator variant of LoadDat_from_segments, which loads one segment at
+a time.  Memory use is bounded by the size of one segment's file, so
+reductions over runs that do not fit into memory are possible, see
+stream_utils.
+
+tstart -- start-times of the segments, as returned by FindLatestSegments.
+          If None, they are read from the segments.
+cache  -- cache_utils.SegmentCache (or its directory) for parsed files
+stitch -- if True, drop the rows of each segment that are superseded by
+          later segments, as LoadDat_from_segments does.  The first row of
+          the later files is read beforehand.
+
+YIELDS (segment, tstart, D) for each segment containing 'filename',
+       D being the dictionary of (N,2) arrays of this segment, indexed by legend
+"""
+    cache=cache_utils.GetCache(cache)
+    segments=[(seg, t) for seg,t in zip(segments, _SegmentStart(segments, tstart))
+              if os.path.exists(os.path.join(seg,filename))]
+    if stitch:
+        cutoffs=StitchCutoffs([_FirstDatTime(os.path.join(seg,filename))
+                               for seg,t in segments])
+    else:
+        cutoffs=[np.inf]*len(segments)
+    for (seg,t),cutoff in zip(segments, cutoffs):
+        tmp=_LoadDat_segment(os.path.join(seg,filename), cache=cache)
+        if tmp is not None:
+            yield seg, t, _TrimRows(tmp.dict(), cutoff)
+
+
+def _LazyWaveform(segments, filename, dataset_matches='', group_matches='',
+                  stitch=True, **options):
+    """Loader of ImportRun(lazy=True) for waveform files: a waveform_utils.Waveform.
+The other options of the loaders (workers, cache, state, ...) do not apply."""
+    import spec_diagnose.waveform_utils as waveform_utils
+    return waveform_utils.Waveform(segments, filename, dataset_matches=dataset_matches,
+                                   group_matches=group_matches, stitch=stitch)
+
+
 def ImportRun(path_to_ev, Lev, tmin=-1e10, tmax=1e10,verbosity=0,
               horizons=True, diagnostics=True, GridExtents=True,
-              h22Finite=False):
+              h22Finite=False, workers=None, executor='thread', cache=None,
+              lazy=False, profile=None, table=False, stitch=True, views=False):
     """ImportRun
 
 Load some important files for a certain Ev/Lev*, and populate a
 dictionary with the imported data.
-  path_to_ev -- Ev/ directory from which to import data
+  path_to_ev -- Ev/ directory from which to import data, or a file written by
+                archive_utils.CompactRun, which is returned as ImportRun
+                returned it then, without 'ImportInfo' (all other options
+                are ignored then, e.g. lazy and table)
   Lev [int]  -- Integer Lev
   tmin/tmax  -- load only segments overlapping this time-range.
                 Negative tmin counts from the end of the run, e.g.
@@ -311,9 +1126,48 @@ dictionary with the imported data.
                               GrAdjustMaxTstepToDampingTimes.dat,
                               GrAdjustSubChunksToDampingTimes.dat, TStepperDiag.dat
   GridExtents-- if True, load AdjustGridExtents.h5
-  h22Finite  -- if True, load the (2,2) mode of GW2/rh_FiniteRadii_CodeUnits.h5"""
+  h22Finite  -- if True, load the (2,2) mode of GW2/rh_FiniteRadii_CodeUnits.h5
+  workers    -- if >1, read all (file, segment) pairs concurrently on a pool
+                of this many workers.  The result is identical to the serial import.
+  executor   -- 'thread' or 'process', the kind of pool used for workers>1,
+                or an already running concurrent.futures.Executor
+                (RefreshRun then uses 'thread').
+                'pipeline' reads the files of upcoming segments on a separate
+                thread while 'workers' threads parse the files already read
+                (also with workers=None), see pipeline_utils.
+  cache      -- cache_utils.SegmentCache, or a directory for one.  Parsed files
+                are stored there, and re-used as long as they are unchanged,
+                so that repeated imports of a run only re-read the ongoing segment.
+  lazy       -- if True, the .dat files are returned as LazyDat, which read
+                the data of a legend only when it is first accessed, and
+                h22finite as waveform_utils.Waveform, which reads (memory-maps)
+                the data of a radius only when it is first accessed
+  table      -- if True, the .dat files are returned as column_utils.RunTable,
+                with one time index shared by all legends of a file
+  profile    -- profile_utils.ImportProfile, which collects the wall-time, bytes
+                and rows of every file read, and the time spent joining segments
+  stitch     -- if True, drop the data of a segment that is superseded by the
+                next segment (restarted from an earlier checkpoint), so that
+                all times are strictly increasing.  If False, segments are
+                concatenated as they are.
+  views      -- if True, the (N,2) arrays of the legends of a file are read-only
+                views into one block, which saves copying and memory.  If False,
+                they are independent, writable arrays.
+
+D['ImportInfo'] records how the run was imported; use RefreshRun(D)
+to add data written since then."""
+    if os.path.isfile(path_to_ev):
+        import spec_diagnose.archive_utils as archive_utils
+        if not archive_utils.IsCompactRun(path_to_ev):
+            raise IOError("{} is neither an Ev/ directory nor a compacted run".format(path_to_ev))
+        return archive_utils.ImportCompactRun(path_to_ev)
+    t0=time.perf_counter()
     D={}
-    segs,tstart,termination=FindLatestSegments(path_to_ev,Lev, tmin=tmin, tmax=tmax)
+    cache=cache_utils.GetCache(cache)
+    segs,tstart,termination=FindLatestSegments(path_to_ev,Lev, tmin=tmin, tmax=tmax,
+                                               workers=workers, cache=cache)
+    if profile is not None:
+        profile.record('FindLatestSegments', wall=time.perf_counter()-t0)
     D['segs']=segs
     D['tstart']=tstart
     if verbosity>=1:
@@ -324,35 +1178,179 @@ dictionary with the imported data.
         print(f"Loading {len(segs)} segments {first_seg} @ {tstart[0]:7.3f} ... {last_seg} @ {tstart[-1]:7.3f}", flush=True)
     D['termination']=termination
 
+    # groups of files to load: (status message, [(key, loader, filename, options)])
+    dat={'lazy': lazy, 'table': table}
+    groups=[]
     if horizons:
-        if verbosity==1: print("Horizons",end='')
-        D['Horizons']=  LoadH5_from_segments(segs,"ApparentHorizons/Horizons.h5", verbose=verbosity>=2)
-        D['AhA']=       LoadDat_from_segments(segs,"ApparentHorizons/AhA.dat", verbose=verbosity>=2)
-        D['AhB']=       LoadDat_from_segments(segs,"ApparentHorizons/AhB.dat", verbose=verbosity>=2)
-        D['AhC']=       LoadDat_from_segments(segs,"ApparentHorizons/AhC.dat", verbose=verbosity>=2)
-        D['ForContinuation'] = LoadDat_from_segments(segs,"ForContinuation/AhC.dat", verbose=verbosity>=2)
-        D['sep']=       LoadDat_from_segments(segs,"ApparentHorizons/HorizonSepMeasures.dat", verbose=verbosity>=2)
+        groups.append(("Horizons", [
+            ('Horizons', LoadH5_from_segments, "ApparentHorizons/Horizons.h5", {}),
+            ('AhA', LoadDat_from_segments, "ApparentHorizons/AhA.dat", dat),
+            ('AhB', LoadDat_from_segments, "ApparentHorizons/AhB.dat", dat),
+            ('AhC', LoadDat_from_segments, "ApparentHorizons/AhC.dat", dat),
+            ('ForContinuation', LoadDat_from_segments, "ForContinuation/AhC.dat", dat),
+            ('sep', LoadDat_from_segments, "ApparentHorizons/HorizonSepMeasures.dat", dat),
+            ]))
     if diagnostics:
-        if verbosity==1: print(", Constraints",end='')
-        D['GhCeLinf'] = LoadDat_from_segments(segs,"ConstraintNorms/GhCe_Linf.dat", verbose=verbosity>=2)
-        if verbosity==1: print(", DiagAhSpeeds",end='')
-        D['DiagAhSpeedA'] = LoadDat_from_segments(segs,"DiagAhSpeedA.dat", verbose=verbosity>=2)
-        D['DiagAhSpeedB'] = LoadDat_from_segments(segs,"DiagAhSpeedB.dat", verbose=verbosity>=2)
-        D['DiagAhSpeedC'] = LoadDat_from_segments(segs,"DiagAhSpeedC.dat", verbose=verbosity>=2)
-        if verbosity==1: print(", DampingTimes",end='')
-        D['GrAdjustMaxTstepToDampingTimes'] = \
-            LoadDat_from_segments(segs,"GrAdjustMaxTstepToDampingTimes.dat", verbose=verbosity>=2)
-        D['GrAdjustSubChunksToDampingTimes'] = \
-            LoadDat_from_segments(segs,"GrAdjustSubChunksToDampingTimes.dat", verbose=verbosity>=2)
-        D['TStepperDiag'] = LoadDat_from_segments(segs,"TStepperDiag.dat", verbose=verbosity>=2)
-        D['TimeInfo'] = LoadDat_from_segments(segs,"TimeInfo.dat", verbose=verbosity>=2)
+        groups.append((", Constraints", [
+            ('GhCeLinf', LoadDat_from_segments, "ConstraintNorms/GhCe_Linf.dat", dat),
+            ]))
+        groups.append((", DiagAhSpeeds", [
+            ('DiagAhSpeedA', LoadDat_from_segments, "DiagAhSpeedA.dat", dat),
+            ('DiagAhSpeedB', LoadDat_from_segments, "DiagAhSpeedB.dat", dat),
+            ('DiagAhSpeedC', LoadDat_from_segments, "DiagAhSpeedC.dat", dat),
+            ]))
+        groups.append((", DampingTimes", [
+            ('GrAdjustMaxTstepToDampingTimes', LoadDat_from_segments,
+             "GrAdjustMaxTstepToDampingTimes.dat", dat),
+            ('GrAdjustSubChunksToDampingTimes', LoadDat_from_segments,
+             "GrAdjustSubChunksToDampingTimes.dat", dat),
+            ('TStepperDiag', LoadDat_from_segments, "TStepperDiag.dat", dat),
+            ('TimeInfo', LoadDat_from_segments, "TimeInfo.dat", dat),
+            ]))
     if GridExtents:
-        if verbosity==1: print(", GridExtents",end='')
-        D['AdjustGrid']=LoadH5_from_segments(segs,"AdjustGridExtents.h5", verbose=verbosity>=2)
+        groups.append((", GridExtents", [
+            ('AdjustGrid', LoadH5_from_segments, "AdjustGridExtents.h5", {}),
+            ]))
     if h22Finite:
-        if verbosity==1: print(", h22Finite", end='')
-        D['h22finite']=LoadH5_from_segments(segs, "GW2/rh_FiniteRadii_CodeUnits.h5",
-            dataset_matches='.*Y_l2_m2.dat',
-            verbose=verbosity>=2)
+        groups.append((", h22Finite", [
+            ('h22finite', _LazyWaveform if lazy else LoadH5_from_segments,
+             "GW2/rh_FiniteRadii_CodeUnits.h5",
+             {'dataset_matches': '.*Y_l2_m2.dat', 'lazy': True} if lazy
+             else {'dataset_matches': '.*Y_l2_m2.dat'}),
+            ]))
+
+    state={key: {} for label, jobs in groups for key, loader, filename, options in jobs}
+    if not _UsePool(workers, executor):
+        for label, jobs in groups:
+            if verbosity==1: print(label,end='')
+            for key, loader, filename, options in jobs:
+                D[key]=loader(segs, filename, verbose=verbosity>=2, cache=cache,
+                              state=state[key], profile=profile, stitch=stitch,
+                              views=views, **options)
+    else:
+        # all loaders share one pool, so that reads of different files
+        # and different segments overlap.  The loaders themselves only wait
+        # for their reads and run on a separate set of threads.
+        n_jobs=sum(len(jobs) for label,jobs in groups)
+        with (contextlib.nullcontext(executor) if isinstance(executor, Executor)
+              else _NewExecutor(executor, workers)) as pool, \
+             ThreadPoolExecutor(max_workers=max(n_jobs,1)) as loaders:
+            futures=[(label, [(key, loaders.submit(loader, segs, filename,
+                                                   verbose=verbosity>=2,
+                                                   executor=pool, cache=cache,
+                                                   state=state[key], profile=profile,
+                                                   stitch=stitch, views=views,
+                                                   **options))
+                              for key, loader, filename, options in jobs])
+                     for label, jobs in groups]
+            for label, jobs in futures:
+                if verbosity==1: print(label,end='')
+                for key, future in jobs:
+                    D[key]=future.result()
+    if cache is not None:
+        cache.evict()
     if verbosity==1: print("", flush=True)
+    D['ImportInfo']={'path_to_ev': path_to_ev, 'Lev': Lev, 'tmin': tmin, 'tmax': tmax,
+                     # a running Executor may be shut down before RefreshRun
+                     'workers': workers, 'cache': cache,
+                     'executor': executor if isinstance(executor, str) else 'thread',
+                     'options': {'horizons': horizons, 'diagnostics': diagnostics,
+                                 'GridExtents': GridExtents, 'h22Finite': h22Finite,
+                                 'lazy': lazy, 'table': table, 'stitch': stitch,
+                                 'views': views},
+                     'files': [job for label, jobs in groups for job in jobs],
+                     'state': state}
+    if profile is not None:
+        profile.record('ImportRun', wall=time.perf_counter()-t0)
+    return D
+
+
+def RefreshRun(D, verbosity=0):
+    """RefreshRun
+
+Update a dictionary returned by ImportRun with data written since
+it was imported (or last refreshed), for monitoring a running simulation.
+Appends new segments, and the rows appended to the .dat files of the
+segment that was last at the time of import.  .h5 files of that segment
+are re-read.  The cost is independent of the length of the run.
+  D         -- dictionary from ImportRun, updated in place
+  verbosity -- as for ImportRun
+
+RETURNS
+  D
+"""
+    if 'ImportInfo' not in D:
+        raise ValueError("RefreshRun needs a run imported from an Ev/ directory, "
+                         "not from a compacted run")
+    info=D['ImportInfo']
+    segs,tstart,termination=FindLatestSegments(info['path_to_ev'], info['Lev'],
+                                               tmin=info['tmin'], tmax=info['tmax'],
+                                               workers=info['workers'],
+                                               cache=info['cache'])
+    if len(D['segs'])==0 or D['segs'][-1] not in segs:
+        # nothing to continue from
+        D.clear()
+        D.update(ImportRun(info['path_to_ev'], info['Lev'], tmin=info['tmin'],
+                           tmax=info['tmax'], verbosity=verbosity,
+                           workers=info['workers'], executor=info['executor'],
+                           cache=info['cache'], **info['options']))
+        return D
+
+    last=D['segs'][-1]
+    idx=segs.index(last)
+    D['termination'][-1]=termination[idx]
+    new_segs=segs[idx+1:]
+    D['segs'].extend(new_segs)
+    D['tstart'].extend(tstart[idx+1:])
+    D['termination'].extend(termination[idx+1:])
+    if verbosity>=1:
+        print(f"Refreshing {last[last.find('Lev'):]} and {len(new_segs)} new segments", flush=True)
+
+    stitch=info['options'].get('stitch', False)
+    options={'verbose': verbosity>=2, 'workers': info['workers'],
+             'executor': info['executor'], 'cache': info['cache'], 'stitch': stitch,
+             'views': info['options'].get('views', False)}
+    for key, loader, filename, file_options in info['files']:
+        state=info['state'][key]
+        if isinstance(D[key], LazyDat):
+            # re-use the arrays read from files that did not change
+            D[key]=LazyDat([os.path.join(seg, filename) for seg in D['segs']],
+                           cache=info['cache'], stitch=stitch, previous=D[key])
+        elif file_options.get('lazy', False):
+            # only the structure is read up front, so just index all segments again
+            D[key]=loader(D['segs'], filename, **options, **file_options)
+        elif loader is LoadDat_from_segments and file_options.get('table', False):
+            parts=[D[key]]
+            f=os.path.join(last, filename)
+            if os.path.exists(f):
+                tmp, state['offset']=_ReadDatTail(f, state['offset'])
+                if tmp is not None:
+                    parts.append(RunTable.from_legend_columns(tmp))
+            if len(new_segs)>0:
+                state.clear()
+                parts.append(loader(new_segs, filename, state=state, **options, **file_options))
+            D[key]=RunTable.concatenate(parts, stitch=stitch)
+        elif loader is LoadDat_from_segments:
+            parts=[]
+            f=os.path.join(last, filename)
+            if os.path.exists(f):
+                tmp, state['offset']=LoadDat_tail(f, state['offset'])
+                parts.append(tmp)
+            if len(new_segs)>0:
+                state.clear()
+                parts.append(loader(new_segs, filename, state=state, **options, **file_options))
+            if stitch:
+                _StitchLegends([D[key]]+parts)
+            for tmp in parts:
+                _MergeSegment(D[key], tmp)
+            _Materialize(D[key])
+        else:
+            # h5 files cannot be extended; drop the data of the last segment
+            # and read it again
+            _Truncate(D[key], state['rows'])
+            reread=[last]+new_segs
+            _MergeSegment(D[key], loader(reread[:-1], filename, **options, **file_options))
+            state['rows']=_Rows(D[key])
+            _MergeSegment(D[key], loader(reread[-1:], filename, **options, **file_options))
+            _Materialize(D[key], stitch=stitch)
     return D
@@ -0,0 +1,146 @@
+"""
+Streaming reductions over the segments of a run.
+
+segment_utils.IterDat_from_segments and IterH5_from_segments yield the
+data of one segment at a time.  The reducers here fold these per-segment
+dictionaries into small results, so that e.g. the maximum of the
+constraints in each subdomain can be computed for runs that do not fit
+into memory.
+
+A reducer is updated with the (possibly nested) dictionary of arrays of
+one segment, and keeps a state for every array in it.  result() returns
+a dictionary of the same structure.
+
+Example:
+  segs,tstart,term=FindLatestSegments(EvDir, Lev)
+  it=IterDat_from_segments(segs, 'ConstraintNorms/GhCe_Linf.dat', tstart)
+  MinMax,Last=Reduce(it, RunningMinMax(), LastValue())
+  MinMax['Linf(GhCe) on SphereA0'] --> (min, max)
+"""
+
+import numpy as np
+
+from spec_diagnose.column_utils import ColumnBuffer
+
+
+class Reducer:
+    """
+Base class of the streaming reducers.  Subclasses implement
+  _update(state, data) -- fold the array 'data' of one segment into
+                          'state' (None for the first segment), return
+                          the new state
+  _result(state)       -- turn the final state into the result
+"""
+
+    def __init__(self):
+        self._state={}   # key-path (tuple) -> state
+
+    def update(self, D):
+        """Fold the dictionary D of one segment into the reduction"""
+        self._update_dict(D, ())
+
+    def _update_dict(self, D, path):
+        for k,v in D.items():
+            if isinstance(v, dict):
+                self._update_dict(v, path+(k,))
+                continue
+            v=np.asarray(v)
+            if v.ndim==0 or len(v)==0:
+                continue
+            key=path+(k,)
+            self._state[key]=self._update(self._state.get(key), v)
+
+    def result(self):
+        """Return the reduction, a dictionary with the structure of the input"""
+        out={}
+        for key,state in self._state.items():
+            d=out
+            for k in key[:-1]:
+                d=d.setdefault(k, {})
+            d[key[-1]]=self._result(state)
+        return out
+
+    def _update(self, state, data):
+        raise NotImplementedError
+
+    def _result(self, state):
+        return state
+
+
+class RunningMinMax(Reducer):
+    """
+RunningMinMax(column=1)
+
+Minimum and maximum of column 'column' of each array over all rows
+(column=None: over the whole array).  The result for each array is
+the tuple (min, max).  NaNs are ignored; (nan, nan) if there are
+no other values.
+"""
+
+    def __init__(self, column=1):
+        Reducer.__init__(self)
+        self.column=column
+
+    def _update(self, state, data):
+        if self.column is not None:
+            data=data[:,self.column]
+        # fmin/fmax ignore NaN, also when combining with the state, so that
+        # a segment without valid values does not spoil the others
+        lo=np.fmin.reduce(data, axis=None, initial=np.nan)
+        hi=np.fmax.reduce(data, axis=None, initial=np.nan)
+        if state is None:
+            return (lo, hi)
+        return (np.fmin(state[0], lo), np.fmax(state[1], hi))
+
+
+class LastValue(Reducer):
+    """
+LastValue()
+
+The last row of each array, e.g. [time, value] of the last
+output of each legend of a .dat file.
+"""
+
+    def _update(self, state, data):
+        return data[-1].copy()
+
+
+class DecimatedSamples(Reducer):
+    """
+DecimatedSamples(step)
+
+Every step'th row of each array, counted over all segments, i.e. the
+same rows as data[::step] of the array returned by the loaders, if the
+iterator stitches the segments like they do (stitch=True).
+"""
+
+    def __init__(self, step):
+        Reducer.__init__(self)
+        if step<1:
+            raise ValueError("step must be positive, not {}".format(step))
+        self.step=step
+
+    def _update(self, state, data):
+        if state is None:
+            state=[0, ColumnBuffer()]   # [rows seen, samples]
+        first=(-state[0])%self.step
+        state[1].append(data[first::self.step].copy())
+        state[0]+=len(data)
+        return state
+
+    def _result(self, state):
+        return state[1].array()
+
+
+def Reduce(iterator, *reducers):
+    """
+Reduce(iterator, *reducers)
+
+Feed the per-segment dictionaries yielded by
+IterDat_from_segments/IterH5_from_segments to the reducers.
+Returns the list of their results, in the order of 'reducers'.
+"""
+    for seg,tstart,D in iterator:
+        for r in reducers:
+            r.update(D)
+    return [r.result() for r in reducers]
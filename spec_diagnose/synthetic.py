@@ -0,0 +1,176 @@
+"""
+Synthetic SpEC runs, for testing and benchmarking the loaders.
+
+MakeSyntheticRun writes an Ev/ directory with the layout of a SpEC
+binary black hole run: inspiral segments Lev?_AA, Lev?_AB, ... and
+ringdown segments Lev?_Ringdown/Lev?_AA, ..., each with RestartTimes.txt
+(or Evolution.input), TerminationReason.txt, the .dat files and the .h5
+files read by segment_utils.ImportRun.  The content is random, but the
+legends, the changing number of subdomains in GhCe_Linf.dat and the
+structure of the .h5 files follow SpEC.
+
+Example:
+  EvDir=MakeSyntheticRun('/tmp/run', segments=20, rows=1000)
+  D=ImportRun(EvDir, 2)
+"""
+
+import os
+import h5py
+import numpy as np
+
+# legends of the .dat files, without the time column
+_DAT_FILES={
+    'ApparentHorizons/Ah{}.dat': [
+        'ArealMass', 'Area', 'sqrt(Area/16pi)', 'min(r)', 'max(r)',
+        'min(|r^i-c^i|)', 'max(|r^i-c^i|)', 'L_surface', 'L_mesh', 'L_max',
+        'NumIterations', 'convg reason', 'Shape_TruncationError',
+        'Center_x', 'Center_y', 'Center_z'],
+    'DiagAhSpeed{}.dat': [
+        'TargetCharSpeed', 'Qa', 'CharSpeed', 'ComovingMinCharSpeed', 'Q',
+        'CharSpeedMax', 'ComovingMinCharSpeedMax', 'DeltaR0', 'MinDeltaR0',
+        'ActivationState', 'RelDeltaR0', 'MinRelDeltaR0', 'DtLambdaAH',
+        'DtLambda', 'LambdaAH', 'Lambda'],
+}
+_RUN_DAT_FILES={
+    'ApparentHorizons/HorizonSepMeasures.dat': ['ProperSep', 'CoordSep'],
+    'GrAdjustMaxTstepToDampingTimes.dat': [
+        'MaxAllowedTstep', 'Tdamp(LambdaFactorA0)', 'Tdamp(LambdaFactorB0)'],
+    'GrAdjustSubChunksToDampingTimes.dat': [
+        'TargetChunkSize', 'ActualChunkSize', 'SubChunksPerChunk',
+        'Tdamp(LambdaFactorA)', 'Tdamp(LambdaFactorA0)',
+        'Tdamp(LambdaFactorB)', 'Tdamp(LambdaFactorB0)',
+        'Tdamp(CutX)', 'Tdamp(ExpansionFactor)', 'Tdamp(QuatRotMatrix)',
+        'Tdamp(SkewAngle)', 'Tdamp(Trans)',
+        'Tdamp(SmoothCoordSep)', 'Tdamp(SmoothMinDeltaRNoLam00AhA)',
+        'Tdamp(SmoothMinDeltaRNoLam00AhB)', 'Tdamp(SmoothRAhA)', 'Tdamp(SmoothRAhB)'],
+    'TStepperDiag.dat': ['dt', 'NumberOfSteps', 'NumberOfRejectedSteps'],
+    'TimeInfo.dat': ['WallClockTime', 'CpuTime'],
+}
+
+
+def MakeSyntheticRun(root, Lev=2, segments=5, ringdown=2, rows=100,
+                     subdomains=(24, 28), segment_length=10., lmax=8,
+                     radii=(100, 200), seed=0):
+    """
+MakeSyntheticRun(root, Lev=2, segments=5, ringdown=2, rows=100, ...)
+
+Write a synthetic SpEC run into root/Ev, and return the name of the
+Ev/ directory.
+  Lev            -- Lev of the segments
+  segments       -- number of inspiral segments
+  ringdown       -- number of ringdown segments
+  rows           -- rows of each .dat and .h5 data-set per segment
+  subdomains     -- number of spherical shells around each horizon in
+                    GhCe_Linf.dat, cycled through from segment to segment
+  segment_length -- time covered by each segment
+  lmax           -- largest l of the modes in GW2/rh_FiniteRadii_CodeUnits.h5
+  radii          -- extraction radii in GW2/rh_FiniteRadii_CodeUnits.h5
+  seed           -- seed of the random numbers
+
+The last segment of the ringdown (or of the inspiral, if ringdown=0)
+is ongoing, the others terminated with WallClock.  The inspiral ends
+with a common horizon in ForContinuation/AhC.dat.
+"""
+    rng=np.random.default_rng(seed)
+    EvDir=os.path.join(root, 'Ev')
+    names=['Lev{}_{}'.format(Lev, _SegmentSuffix(i)) for i in range(segments)] \
+         +['Lev{}_Ringdown/Lev{}_{}'.format(Lev, Lev, _SegmentSuffix(i)) for i in range(ringdown)]
+    for idx,name in enumerate(names):
+        inspiral=idx<segments
+        # the ringdown starts a bit before the end of the inspiral
+        tstart=idx*segment_length if inspiral else \
+               (segments-0.5+idx-segments)*segment_length
+        ongoing=idx==len(names)-1
+        _MakeSegment(os.path.join(EvDir, name, 'Run'), rng, tstart,
+                     tstart+segment_length, rows,
+                     AHs='AB' if inspiral else 'C',
+                     nsub=subdomains[idx%len(subdomains)],
+                     first=name.endswith('_AA'), ongoing=ongoing,
+                     continuation=inspiral and idx==segments-1,
+                     lmax=lmax, radii=radii)
+    return EvDir
+
+
+def _SegmentSuffix(i):
+    """AA, AB, ..., AZ, BA, ..."""
+    return chr(ord('A')+i//26)+chr(ord('A')+i%26)
+
+
+def _WriteDat(F, t, legends, data):
+    """.dat file with SpEC legend header"""
+    os.makedirs(os.path.dirname(F), exist_ok=True)
+    with open(F, 'w') as f:
+        f.write('# {}\n'.format(os.path.basename(F)))
+        for k,legend in enumerate(['time']+legends):
+            f.write('# [{}] = {}\n'.format(k+1, legend))
+        np.savetxt(f, np.column_stack([t, data]), fmt='%.14g')
+
+
+def _WriteH5Dat(group, name, t, legends, data):
+    """data-set of a SpEC .h5 file, with its Legend attribute"""
+    ds=group.create_dataset(name, data=np.column_stack([t, data]))
+    ds.attrs['Legend']=['time']+legends
+
+
+def _MakeSegment(run, rng, t0, t1, rows, AHs, nsub, first, ongoing,
+                 continuation, lmax, radii):
+    os.makedirs(run, exist_ok=True)
+    t=np.linspace(t0, t1, rows, endpoint=False)
+    if first:
+        with open(os.path.join(run, 'Evolution.input'), 'w') as f:
+            f.write('DataBoxItems =\n    ReadFromFile(File=SpatialCoordMap.input),\n;\n')
+            f.write('  StartTime = {};\n'.format(t0))
+            f.write('  FinalTime = 1e10;\n')
+    # RestartTimes.txt: start-time, then the times of the checkpoints
+    with open(os.path.join(run, 'RestartTimes.txt'), 'w') as f:
+        for tc in np.arange(t0, t1, (t1-t0)/4):
+            f.write('{:.14g}\n'.format(tc))
+    if not ongoing:
+        with open(os.path.join(run, 'TerminationReason.txt'), 'w') as f:
+            f.write('Termination condition WallClock\n')
+
+    for pattern,legends in _DAT_FILES.items():
+        for AH in 'ABC':
+            _WriteDat(os.path.join(run, pattern.format(AH)), t, legends,
+                      rng.random((rows, len(legends))))
+    for F,legends in _RUN_DAT_FILES.items():
+        _WriteDat(os.path.join(run, F), t, legends, rng.random((rows, len(legends))))
+    if continuation:
+        legends=_DAT_FILES['ApparentHorizons/Ah{}.dat']
+        _WriteDat(os.path.join(run, 'ForContinuation', 'AhC.dat'), t[-rows//10:], legends,
+                  rng.random((len(t[-rows//10:]), len(legends))))
+
+    # constraints with changing set of subdomains
+    shells=['Sphere{}{}'.format(AH, k) for AH in AHs for k in range(nsub)]
+    legends=shells+['CylinderEA0', 'CylinderEB0', 'FilledCylinderCA0', 'FilledCylinderCB0']
+    _WriteDat(os.path.join(run, 'ConstraintNorms', 'GhCe_Linf.dat'), t, legends,
+              10.**rng.uniform(-10, -4, (rows, len(legends))))
+
+    with h5py.File(os.path.join(run, 'ApparentHorizons', 'Horizons.h5'), 'w') as F:
+        for AH in AHs:
+            g=F.create_group('Ah{}.dir'.format(AH))
+            _WriteH5Dat(g, 'ArealMass.dat', t, ['ArealMass'], rng.random((rows, 1)))
+            _WriteH5Dat(g, 'ChristodoulouMass.dat', t, ['ChristodoulouMass'], rng.random((rows, 1)))
+            _WriteH5Dat(g, 'CoordCenterInertial.dat', t, ['x', 'y', 'z'], rng.random((rows, 3)))
+            _WriteH5Dat(g, 'DimensionfulInertialSpin.dat', t, ['x', 'y', 'z'], rng.random((rows, 3)))
+
+    with h5py.File(os.path.join(run, 'AdjustGridExtents.h5'), 'w') as F:
+        for SD in shells:
+            g=F.create_group(SD+'.dir')
+            _WriteH5Dat(g, 'Extents.dat', t, ['Extent[0]', 'Extent[1]', 'Extent[2]'],
+                        rng.integers(10, 30, (rows, 3)).astype(float))
+            for bf in 'Bf0I1', 'Bf1S2', 'Bf2S2':
+                b=g.create_group(bf+'.dir')
+                _WriteH5Dat(b, 'TruncationErrorExcess.dat', t, ['TruncationErrorExcess'],
+                            rng.uniform(-1, 0.1, (rows, 1)))
+                _WriteH5Dat(b, 'MinNumberOfPiledUpModes.dat', t, ['MinNumberOfPiledUpModes'],
+                            rng.integers(0, 3, (rows, 1)).astype(float))
+
+    os.makedirs(os.path.join(run, 'GW2'), exist_ok=True)
+    with h5py.File(os.path.join(run, 'GW2', 'rh_FiniteRadii_CodeUnits.h5'), 'w') as F:
+        for R in radii:
+            g=F.create_group('R{:04d}.dir'.format(R))
+            for l in range(2, lmax+1):
+                for m in range(-l, l+1):
+                    _WriteH5Dat(g, 'Y_l{}_m{}.dat'.format(l, m), t+R, ['Re', 'Im'],
+                                rng.normal(0, 10.**-l, (rows, 2)))
@@ -0,0 +1,349 @@
+"""
+Lazy access to the waveform files of a run, like GW2/rh_FiniteRadii_CodeUnits.h5.
+
+A Waveform indexes the radii and modes of the file in all segments, but
+reads the data of a (radius, mode) only when it is requested, and then
+only the bytes of that data-set.  Contiguous, uncompressed data-sets (as
+written by SpEC) are read through numpy.memmap, other data-sets through h5py.
+
+LoadModes_from_segments instead reads all modes at all radii into one
+dense complex array of shape (radius, mode, time), for analyses across
+modes and radii with numpy broadcasting.
+
+Example:
+  segs,tstart,term=FindLatestSegments(EvDir, 2)
+  wf=Waveform(segs)
+  h22=wf.mode(-1, 2, 2)     # (N,3) array [t, Re, Im] at the outermost radius
+  PlotGravitationalWave(ax, wf, 2, 2, label='h')
+
+  W=LoadModes_from_segments(segs, lmax=8)
+  h=W.data[:, W.index(2,2)]   # (2,2) mode at all radii, shape (radius, time)
+"""
+
+import os
+import re
+from collections.abc import Mapping
+
+import h5py
+import numpy as np
+
+from spec_diagnose.column_utils import LegendColumns, StitchRows
+
+_MODE_RE=re.compile(r'Y_l(\d+)_m(-?\d+)$')
+
+
+def ModeName(l, m):
+    """name of the data-set of mode (l,m), without extension, e.g. 'Y_l2_m2'"""
+    return 'Y_l{}_m{}'.format(l, m)
+
+
+def ParseModeName(name):
+    """(l,m) of a data-set name like 'Y_l2_m-1' (or 'Y_l2_m-1.dat'), None for other names"""
+    match=_MODE_RE.match(name[:-4] if name.endswith('.dat') else name)
+    if match is None:
+        return None
+    return int(match.group(1)), int(match.group(2))
+
+
+def ModeIndex(l, m, lmin=2):
+    """index of mode (l,m) in the order (lmin,-lmin), ..., (lmin,lmin), (lmin+1,-lmin-1), ..."""
+    if not (l>=lmin and -l<=m<=l):
+        raise KeyError((l, m))
+    return l*l+l+m-lmin*lmin
+
+
+def Modes(lmax, lmin=2):
+    """all (l,m) with lmin <= l <= lmax, in the order of ModeIndex"""
+    return [(l, m) for l in range(lmin, lmax+1) for m in range(-l, l+1)]
+
+
+def _RadiusValue(name):
+    """extraction radius of a group name like 'R0100', NaN if there is none"""
+    match=re.match(r'R(\d+(\.\d*)?)$', name)
+    return float(match.group(1)) if match else np.nan
+
+
+def _MemmapOffset(dataset):
+    """byte offset of the data of an h5 data-set in its file, if it can be
+memory-mapped (contiguous, without filters, allocated); else None"""
+    if dataset.chunks is not None or dataset.dtype.kind not in 'fiu' \
+       or dataset.id.get_create_plist().get_external_count()>0:
+        return None
+    return dataset.id.get_offset()
+
+
+def _IndexFile(F, dataset_re, group_re):
+    """The data-sets of one waveform file: dictionary
+radius -> dictionary mode -> (F, path, offset, shape, dtype, legends)"""
+    index={}
+    with h5py.File(F, 'r') as H5:
+        for g in H5.keys():
+            if not g.endswith('.dir') or not group_re.match('/'+g):
+                continue
+            group=H5[g]
+            modes={}
+            for k in group.keys():
+                path='/'+g+'/'+k
+                if not k.endswith('.dat') or not dataset_re.match(path):
+                    continue
+                ds=group[k]
+                legends=None
+                if 'Legend' in ds.attrs:
+                    legends={legend if isinstance(legend, str) else legend.decode('utf-8'): i
+                             for i,legend in enumerate(ds.attrs['Legend'])}
+                modes[k[:-4]]=(F, path, _MemmapOffset(ds), ds.shape, ds.dtype, legends)
+            if len(modes)>0:
+                index[g[:-4]]=modes
+    return index
+
+
+def _ReadEntry(entry):
+    """the data of one data-set found by _IndexFile"""
+    F, path, offset, shape, dtype, legends=entry
+    if offset is not None:
+        return np.memmap(F, dtype=dtype, mode='r', offset=offset, shape=shape)
+    with h5py.File(F, 'r') as H5:
+        return H5[path][()]
+
+
+class Waveform(Mapping):
+    """
+Waveform(segments, filename='GW2/rh_FiniteRadii_CodeUnits.h5',
+         dataset_matches='', group_matches='', stitch=True)
+
+Lazy, dictionary-like view of a waveform file across segments.
+  segments        -- list of segments (incl. '/Run' directories), see FindLatestSegments
+  filename        -- the waveform file, relative to the segments
+  dataset_matches -- only index data-sets matching this regex (e.g. '.*Y_l2_m2.dat')
+  group_matches   -- only index radii matching this regex (e.g. '/R0200')
+  stitch          -- if True, drop data of a segment that overlaps the next
+                     one, see column_utils.StitchRows
+
+On construction only the structure of the files is read.  wf[radius][mode]
+has the same form as the result of LoadH5_from_segments, e.g.
+wf['R0100']['Y_l2_m2'] is a dictionary of (N,2) arrays indexed by legend.
+The data of a (radius, mode) is read and joined across segments when it
+is first accessed, and kept afterwards.
+"""
+
+    def __init__(self, segments, filename='GW2/rh_FiniteRadii_CodeUnits.h5',
+                 dataset_matches='', group_matches='', stitch=True):
+        self.stitch=stitch
+        dataset_re=re.compile(dataset_matches)
+        group_re=re.compile(group_matches)
+        # radius -> mode -> list of data-sets, one per segment
+        self._index={}
+        for seg in segments:
+            F=os.path.join(seg, filename)
+            if not os.path.exists(F):
+                continue
+            for radius,modes in _IndexFile(F, dataset_re, group_re).items():
+                R=self._index.setdefault(radius, {})
+                for mode,entry in modes.items():
+                    R.setdefault(mode, []).append(entry)
+        self._data={}
+
+    @property
+    def radii(self):
+        """names of the extraction radii, e.g. ['R0100', 'R0200']"""
+        return list(self._index)
+
+    def modes(self, radius=-1):
+        """(l,m) of the modes at a radius (name or index into radii)"""
+        out=[ParseModeName(mode) for mode in self._index[self._Radius(radius)]]
+        return [lm for lm in out if lm is not None]
+
+    def _Radius(self, radius):
+        if isinstance(radius, str):
+            if radius not in self._index:
+                raise KeyError(radius)
+            return radius
+        return self.radii[radius]
+
+    def array(self, radius, mode):
+        """
+array(radius, mode)
+
+The data-set 'mode' (e.g. 'Y_l2_m2') at 'radius' (name or index into
+radii), joined across segments: an array [t, Re, Im] for SpEC waveforms.
+A data-set of a single segment is returned without copying.
+"""
+        radius=self._Radius(radius)
+        key=(radius, mode)
+        if key not in self._data:
+            if mode not in self._index[radius]:
+                raise KeyError(mode)
+            pieces=[_ReadEntry(entry) for entry in self._index[radius][mode]]
+            if self.stitch and all(piece.ndim==2 for piece in pieces):
+                keep=StitchRows([piece[:,0] for piece in pieces])
+                pieces=[piece[:n] for piece,n in zip(pieces, keep)]
+            self._data[key]=pieces[0] if len(pieces)==1 else np.concatenate(pieces)
+        return self._data[key]
+
+    def mode(self, radius, l, m):
+        """array(radius, ModeName(l,m))"""
+        return self.array(radius, ModeName(l, m))
+
+    def legends(self, radius, mode):
+        """dictionary legend -> column of the data-set, None without legend"""
+        return self._index[self._Radius(radius)][mode][0][5]
+
+    def __getitem__(self, radius):
+        return WaveformRadius(self, self._Radius(radius))
+
+    def __iter__(self):
+        return iter(self._index)
+
+    def __len__(self):
+        return len(self._index)
+
+
+class WaveformRadius(Mapping):
+    """
+The modes of a Waveform at one radius, see Waveform.  wf[radius][mode]
+is a dictionary legend -> (N,2) array, or the data-set itself if it has
+no legend.
+"""
+
+    def __init__(self, waveform, radius):
+        self.waveform=waveform
+        self.radius=radius
+
+    def __getitem__(self, mode):
+        data=self.waveform.array(self.radius, mode)
+        legends=self.waveform.legends(self.radius, mode)
+        if legends is None:
+            return data
+        return LegendColumns(legends, data).dict()
+
+    def __iter__(self):
+        return iter(self.waveform._index[self.radius])
+
+    def __len__(self):
+        return len(self.waveform._index[self.radius])
+
+
+class WaveformModes:
+    """
+WaveformModes(radii, modes, time, data)
+
+All modes of a waveform at all radii, as returned by LoadModes_from_segments.
+  radii -- names of the extraction radii, e.g. ['R0100', 'R0200']
+  R     -- the radii as numbers (NaN if a name contains none)
+  modes -- list of (l,m), in the order of ModeIndex
+  time  -- array (radius, time)
+  data  -- complex array (radius, mode, time), Re+1j*Im of the data-sets
+
+A radius with fewer samples than others is padded with NaN, as are modes
+missing from the files.
+"""
+
+    def __init__(self, radii, modes, time, data):
+        self.radii=list(radii)
+        self.R=np.array([_RadiusValue(radius) for radius in self.radii])
+        self.modes=list(modes)
+        self.time=time
+        self.data=data
+        self._index={lm: i for i,lm in enumerate(self.modes)}
+
+    def index(self, l, m):
+        """index of mode (l,m) along axis 1 of data"""
+        try:
+            return self._index[(l, m)]
+        except KeyError:
+            raise KeyError((l, m)) from None
+
+    def radius(self, radius):
+        """index of a radius (name or index) along axis 0 of data"""
+        if isinstance(radius, str):
+            return self.radii.index(radius)
+        return range(len(self.radii))[radius]
+
+    def mode(self, l, m, radius=-1):
+        """(time, complex data) of mode (l,m) at a radius (name or index)"""
+        r=self.radius(radius)
+        return self.time[r], self.data[r, self.index(l, m)]
+
+
+def _ReadModes(F, lmin, lmax, group_re):
+    """Read all modes lmin <= l <= lmax of one waveform file, in a single
+pass over the file.  Returns dictionary radius -> (time, complex array
+(mode, time)), or None if the file does not exist."""
+    if not os.path.exists(F):
+        return None
+    nmodes=(lmax+1)**2-lmin**2
+    out={}
+    with h5py.File(F, 'r') as H5:
+        for g in H5.keys():
+            if not g.endswith('.dir') or not group_re.match('/'+g):
+                continue
+            group=H5[g]
+            datasets=[]
+            for k in group.keys():
+                lm=ParseModeName(k) if k.endswith('.dat') else None
+                if lm is not None and lmin<=lm[0]<=lmax:
+                    datasets.append((ModeIndex(*lm, lmin=lmin), group[k]))
+            if len(datasets)==0:
+                continue
+            # an ongoing segment may have written some modes further than others
+            n=min(ds.shape[0] for idx,ds in datasets)
+            t=None
+            block=np.full((nmodes, n), np.nan, dtype=complex)
+            for idx,ds in datasets:
+                offset=_MemmapOffset(ds)
+                if offset is None:
+                    a=ds[:n]
+                else:
+                    a=np.memmap(F, dtype=ds.dtype, mode='r', offset=offset, shape=ds.shape)[:n]
+                if t is None:
+                    t=np.array(a[:,0], dtype=float)
+                block.real[idx]=a[:,1]
+                block.imag[idx]=a[:,2]
+            out[g[:-4]]=(t, block)
+    return out
+
+
+def LoadModes_from_segments(segments, filename='GW2/rh_FiniteRadii_CodeUnits.h5',
+                            lmax=8, lmin=2, group_matches='', stitch=True):
+    """
+LoadModes_from_segments(segments, filename='GW2/rh_FiniteRadii_CodeUnits.h5', lmax=8, ...)
+
+Load all modes lmin <= l <= lmax at all radii of a waveform file into
+one dense complex array.  Each segment's file is opened once, and
+contiguous data-sets are read through numpy.memmap.
+  segments      -- list of segments (incl. '/Run' directories), see FindLatestSegments
+  filename      -- the waveform file, relative to the segments
+  group_matches -- only load radii matching this regex (e.g. '/R0200')
+  stitch        -- if True, drop data of a segment that overlaps the next
+                   one, see column_utils.StitchRows
+
+Returns WaveformModes, e.g.
+  W=LoadModes_from_segments(segs)
+  h22=W.data[:, W.index(2,2)]    # shape (radius, time)
+"""
+    group_re=re.compile(group_matches)
+    times={}    # radius -> list of time arrays, one per segment
+    blocks={}   # radius -> list of (mode, time) arrays
+    for seg in segments:
+        tmp=_ReadModes(os.path.join(seg, filename), lmin, lmax, group_re)
+        if tmp is None:
+            continue
+        for radius,(t, block) in tmp.items():
+            times.setdefault(radius, []).append(t)
+            blocks.setdefault(radius, []).append(block)
+    radii=list(times)
+    modes=Modes(lmax, lmin=lmin)
+    if stitch:
+        for radius in radii:
+            keep=StitchRows(times[radius])
+            times[radius]=[t[:n] for t,n in zip(times[radius], keep)]
+            blocks[radius]=[block[:,:n] for block,n in zip(blocks[radius], keep)]
+    ntime=max((sum(len(t) for t in times[radius]) for radius in radii), default=0)
+    time=np.full((len(radii), ntime), np.nan)
+    data=np.full((len(radii), len(modes), ntime), np.nan, dtype=complex)
+    for r,radius in enumerate(radii):
+        n=sum(len(t) for t in times[radius])
+        if n>0:
+            np.concatenate(times[radius], out=time[r,:n])
+            np.concatenate(blocks[radius], axis=1, out=data[r,:,:n])
+    return WaveformModes(radii, modes, time, data)
@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+import spec_diagnose.archive_utils as archive_utils
+import spec_diagnose.segment_utils as segment_utils
+import spec_diagnose.synthetic as synthetic
+
+
+def test_import_compacted_run(tmp_path):
+    EvDir=synthetic.MakeSyntheticRun(str(tmp_path), segments=2, ringdown=0, rows=20)
+    out=str(tmp_path/'run.h5')
+    archive_utils.CompactRun(EvDir, 2, out)
+    assert archive_utils.IsCompactRun(out)
+    D=segment_utils.ImportRun(EvDir, 2)
+    A=segment_utils.ImportRun(out, 2)
+    assert A['segs']==D['segs']
+    np.testing.assert_array_equal(A['AhA']['ArealMass'], D['AhA']['ArealMass'])
+    assert 'ImportInfo' not in A
+    with pytest.raises(ValueError):
+        segment_utils.RefreshRun(A)
+
+
+@pytest.mark.parametrize('option', ['lazy', 'table'])
+def test_lazy_and_table_imports_are_rejected(tmp_path, option):
+    EvDir=synthetic.MakeSyntheticRun(str(tmp_path), segments=2, ringdown=0, rows=20)
+    with pytest.raises(ValueError):
+        archive_utils.CompactRun(EvDir, 2, str(tmp_path/'run.h5'), **{option: True})
+
+
+def test_other_files_are_rejected(tmp_path):
+    F=tmp_path/'notes.txt'
+    F.write_text('not a run')
+    assert not archive_utils.IsCompactRun(str(F))
+    with pytest.raises(IOError):
+        segment_utils.ImportRun(str(F), 2)
@@ -0,0 +1,38 @@
+import json
+
+import pytest
+
+import spec_diagnose.benchmark as benchmark
+import spec_diagnose.report as report
+
+
+def test_all_cases_run(tmp_path):
+    out=str(tmp_path/'bench.json')
+    R=benchmark.RunBenchmarks(segments=[2], rows=[20], repeat=1, root=str(tmp_path),
+                              out=out, verbose=False)
+    assert [r['name'] for r in R['results'] if r['error'] is not None]==[]
+    names={r['name'] for r in R['results']}
+    assert any(name.startswith('PlotAH') for name in names)
+    assert any(name.startswith('PlotTruncationErrorSubdomain') for name in names)
+    with open(out) as f:
+        assert json.load(f)['results']==R['results']
+
+
+def test_failed_case_fails_the_run(tmp_path, monkeypatch):
+    def broken():
+        raise AttributeError('broken')
+    Cases=benchmark._Cases
+    monkeypatch.setattr(benchmark, '_Cases',
+                        lambda EvDir, Lev: Cases(EvDir, Lev)[:1]+[('Broken', broken)])
+    out=str(tmp_path/'bench.json')
+    with pytest.raises(benchmark.BenchmarkError) as e:
+        benchmark.RunBenchmarks(segments=[2], rows=[20], repeat=1, root=str(tmp_path),
+                                out=out, verbose=False)
+    assert 'Broken' in str(e.value)
+    with open(out) as f:
+        assert [r['name'] for r in json.load(f)['results'] if r['error']]==['Broken']
+    R=benchmark.RunBenchmarks(segments=[2], rows=[20], repeat=1, root=str(tmp_path),
+                              verbose=False, strict=False)
+    assert R['results'][-1]['error']=='AttributeError: broken'
+    assert report.main(['benchmark', '--segments', '2', '--rows', '20', '--repeat', '1',
+                        '--root', str(tmp_path)])==1
@@ -0,0 +1,39 @@
+import matplotlib
+matplotlib.use('Agg')
+import matplotlib.pyplot as plt
+import pytest
+
+import spec_diagnose.segment_utils as segment_utils
+import spec_diagnose.synthetic as synthetic
+from spec_diagnose.control_systems import ControlSystemsDashboard
+
+
+def Labels(dash):
+    return [line.get_label() for axs in dash.axes for ax in axs for line in ax.lines]
+
+
+@pytest.fixture
+def D(tmp_path):
+    EvDir=synthetic.MakeSyntheticRun(str(tmp_path), segments=2, ringdown=0, rows=50)
+    return segment_utils.ImportRun(EvDir, 2)
+
+
+def test_update_removes_lines_of_missing_keys(D):
+    dash=ControlSystemsDashboard(D, 'A')
+    try:
+        key=[k for k in D['DiagAhSpeedA'] if k!='time'][0]
+        assert key in Labels(dash)
+        assert len(dash.axes[2][7].lines)>0
+        d=D['DiagAhSpeedA'].pop(key)
+        D['ForContinuation']={}
+        dash.update(D)
+        assert key not in Labels(dash)
+        assert len(dash.axes[2][7].lines)==0
+        assert dash.axes[2][7].get_legend() is None
+        # a key that comes back is plotted again
+        D['DiagAhSpeedA'][key]=d
+        dash.update(D)
+        assert key in Labels(dash)
+    finally:
+        for fig in dash.figures:
+            plt.close(fig)
@@ -0,0 +1,38 @@
+import pytest
+
+import spec_diagnose.segment_utils as segment_utils
+import spec_diagnose.synthetic as synthetic
+
+
+@pytest.fixture(scope='module')
+def EvDir(tmp_path_factory):
+    return synthetic.MakeSyntheticRun(str(tmp_path_factory.mktemp('run')),
+                                      segments=42, ringdown=0, rows=2)
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """list of the segments whose metadata was read"""
+    out=[]
+    original=segment_utils._SegmentInfo
+    def counting(seg):
+        out.append(seg)
+        return original(seg)
+    monkeypatch.setattr(segment_utils, '_SegmentInfo', counting)
+    return out
+
+
+@pytest.mark.parametrize('tmin,tmax', [(25, 45), (-1e10, 1e10), (-1e10, 15), (395, 1e10), (1000, 2000)])
+def test_window(EvDir, tmin, tmax):
+    segs,tstart,term=segment_utils.FindLatestSegments(EvDir, 2)
+    expected=[i for i,t in enumerate(tstart) if tmin<t<tmax]
+    result=segment_utils.FindLatestSegments(EvDir, 2, tmin=tmin, tmax=tmax)
+    assert result==([segs[i] for i in expected], [tstart[i] for i in expected],
+                    [term[i] for i in expected])
+
+
+def test_window_reads_few_segments(EvDir, reads):
+    segs,tstart,term=segment_utils.FindLatestSegments(EvDir, 2, tmin=25, tmax=45)
+    assert tstart==[30., 40.]
+    # two bisections of 42 segments, and the 2 selected segments
+    assert len(set(reads))<=2*6+2
@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+import spec_diagnose.segment_utils as segment_utils
+import spec_diagnose.synthetic as synthetic
+
+
+def AssertEqual(A, B, path=''):
+    if isinstance(A, dict):
+        assert isinstance(B, dict) and list(A)==list(B), path
+        for k in A:
+            AssertEqual(A[k], B[k], path+'/'+str(k))
+    elif isinstance(A, np.ndarray):
+        assert isinstance(B, np.ndarray) and A.dtype==B.dtype, path
+        np.testing.assert_array_equal(A, B, err_msg=path)
+    else:
+        assert A==B, path
+
+
+@pytest.fixture(scope='module')
+def EvDir(tmp_path_factory):
+    return synthetic.MakeSyntheticRun(str(tmp_path_factory.mktemp('run')), segments=4,
+                                      ringdown=2, rows=30)
+
+
+@pytest.mark.parametrize('executor', ['thread', 'process', 'pipeline'])
+def test_parallel_import_equals_serial(EvDir, executor):
+    serial=segment_utils.ImportRun(EvDir, 2, h22Finite=True)
+    D=segment_utils.ImportRun(EvDir, 2, h22Finite=True, workers=3, executor=executor)
+    del serial['ImportInfo'], D['ImportInfo']
+    AssertEqual(D, serial)
@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+
+import spec_diagnose.segment_utils as segment_utils
+from spec_diagnose.segment_utils import LazyDat
+
+
+def WriteDat(F, t, legends, seed):
+    os.makedirs(os.path.dirname(F), exist_ok=True)
+    rng=np.random.default_rng(seed)
+    with open(F, 'w') as f:
+        f.write('# test.dat\n')
+        for k,legend in enumerate(['time']+legends):
+            f.write('# [{}] = {}\n'.format(k+1, legend))
+        np.savetxt(f, np.column_stack([t, rng.random((len(t), len(legends)))]))
+
+
+@pytest.fixture
+def files(tmp_path):
+    """three segments overlapping by 2 time units, the last one without legend 'c'"""
+    out=[]
+    for i in range(3):
+        F=str(tmp_path/'seg{}'.format(i)/'test.dat')
+        WriteDat(F, np.arange(10*i, 10*i+12.), ['a', 'b'] if i==2 else ['a', 'b', 'c'], i)
+        out.append(F)
+    return out
+
+
+@pytest.fixture
+def reads(monkeypatch):
+    """list of the files parsed"""
+    out=[]
+    original=segment_utils._ReadDatBlock
+    def counting(F, *args, **kwargs):
+        out.append(F)
+        return original(F, *args, **kwargs)
+    monkeypatch.setattr(segment_utils, '_ReadDatBlock', counting)
+    return out
+
+
+def test_same_as_loader(files):
+    D=segment_utils.LoadDat_from_segments([os.path.dirname(F) for F in files], 'test.dat')
+    L=LazyDat(files)
+    assert list(L)==list(D)
+    for legend in D:
+        np.testing.assert_array_equal(L[legend], D[legend])
+    assert np.all(np.diff(L['a'][:,0])>0)
+
+
+def test_load_parses_each_file_once_and_keeps_no_blocks(files, reads):
+    L=LazyDat(files)
+    L.load(['a', 'b', 'c'])
+    assert sorted(reads)==sorted(files)
+    L['a'], L['c']
+    assert len(reads)==3
+    # the arrays are copies, not views of the parsed files
+    for legend in 'a', 'b', 'c':
+        assert L[legend].base is None
+        assert L[legend].flags.writeable
+
+
+def test_previous_reuses_unchanged_files(files, reads, tmp_path):
+    L=LazyDat(files[:2])
+    a_before=L['a'].copy()
+    # the last segment grows, and a new segment appears
+    WriteDat(files[1], np.arange(10, 25.), ['a', 'b', 'c'], 1)
+    new=str(tmp_path/'seg3'/'test.dat')
+    WriteDat(new, np.arange(20, 30.), ['a', 'b'], 3)
+    reads.clear()
+    R=LazyDat(files+[new], previous=L)
+    R['a']
+    assert files[0] not in reads
+    np.testing.assert_array_equal(R['a'][:10], a_before[:10])
+    fresh=LazyDat(files+[new])
+    for legend in fresh:
+        np.testing.assert_array_equal(R[legend], fresh[legend])
@@ -0,0 +1,49 @@
+import numpy as np
+import pytest
+
+from spec_diagnose.column_utils import LegendColumns
+import spec_diagnose.segment_utils as segment_utils
+import spec_diagnose.synthetic as synthetic
+
+
+def Block(t0, ncols):
+    t=np.arange(t0, t0+5.)
+    return np.column_stack([t]+[t*10+k for k in range(1, ncols)])
+
+
+def test_dict_is_writable_and_independent():
+    L=LegendColumns({'time': 0, 'a': 1, 'b': 2}, Block(0, 3))
+    L.append({'time': 0, 'a': 1, 'b': 2}, Block(5, 3))
+    D=L.dict()
+    for legend in D:
+        assert D[legend].flags.writeable
+    D['a'][:,1]*=2
+    D['a'][:,0]+=1
+    np.testing.assert_array_equal(D['b'][:,0], np.arange(10.))
+    np.testing.assert_array_equal(D['b'][:,1], np.arange(10.)*10+2)
+
+
+def test_dict_with_changing_legends():
+    L=LegendColumns({'time': 0, 'a': 1, 'b': 2}, Block(0, 3))
+    L.append({'time': 0, 'a': 1}, Block(5, 2))
+    D=L.dict()
+    assert D['a'].shape==(10, 2) and D['b'].shape==(5, 2)
+    assert all(D[legend].flags.writeable for legend in D)
+
+
+def test_views_are_read_only():
+    L=LegendColumns({'time': 0, 'a': 1}, Block(0, 2))
+    D=L.dict(views=True)
+    with pytest.raises(ValueError):
+        D['a'][:,1]*=2
+
+
+def test_imported_arrays_are_writable(tmp_path):
+    EvDir=synthetic.MakeSyntheticRun(str(tmp_path), segments=2, ringdown=0, rows=20)
+    D=segment_utils.ImportRun(EvDir, 2)
+    D['AhA']['ArealMass'][:,1]*=2
+    D['Horizons']['AhA']['ArealMass']['ArealMass'][:,1]*=2
+    D['GhCeLinf']['SphereA0'][:,1]*=2
+    V=segment_utils.ImportRun(EvDir, 2, views=True)
+    assert not V['AhA']['ArealMass'].flags.writeable
+    np.testing.assert_array_equal(V['AhA']['ArealMass'][:,1]*2, D['AhA']['ArealMass'][:,1])
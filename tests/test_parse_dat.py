@@ -0,0 +1,50 @@
+import io
+
+import numpy as np
+import pytest
+
+from spec_diagnose.segment_utils import _ParseDat
+
+HEADER=b'# file.dat\n# [1] = time\n# [2] = a\n# [3] = b\n'
+
+
+def test_regular():
+    keys,data=_ParseDat(HEADER+b'0 1 2\n1 3 4\n2 5 6\n')
+    assert keys=={1: 'time', 2: 'a', 3: 'b'}
+    np.testing.assert_array_equal(data, [[0, 1, 2], [1, 3, 4], [2, 5, 6]])
+
+
+def test_no_trailing_newline():
+    keys,data=_ParseDat(HEADER+b'0 1 2\n1 3 4')
+    np.testing.assert_array_equal(data, [[0, 1, 2], [1, 3, 4]])
+
+
+def test_header_only():
+    keys,data=_ParseDat(HEADER)
+    assert data.shape==(0, 3)
+
+
+def test_blank_lines():
+    body=b'0 1 2\n\n1 3 4\n'
+    keys,data=_ParseDat(HEADER+body)
+    np.testing.assert_array_equal(data, np.loadtxt(io.BytesIO(body), ndmin=2))
+
+
+@pytest.mark.parametrize('body', [
+    b'1 2\n3\n4 5 6\n',          # ragged, but 6 numbers in 3 rows
+    b'1 2 3\n4 5\n6 7 8 9\n',    # ragged, compensating row lengths
+])
+def test_ragged_rows_are_rejected(body):
+    with pytest.raises(ValueError):
+        np.loadtxt(io.BytesIO(body), ndmin=2)
+    with pytest.raises(ValueError):
+        _ParseDat(HEADER+body)
+
+
+@pytest.mark.parametrize('body', [
+    b'0 1 2\n1 x 4\n',
+    b'0 1 2\n1 3 nan-ish\n',
+])
+def test_malformed_tokens_are_rejected(body):
+    with pytest.raises(ValueError):
+        _ParseDat(HEADER+body)
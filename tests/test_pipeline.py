@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+import spec_diagnose.pipeline_utils as pipeline_utils
+from spec_diagnose.pipeline_utils import PipelineExecutor
+
+
+@pytest.fixture
+def files(tmp_path):
+    out=[]
+    for i in range(40):
+        F=tmp_path/'f{}.dat'.format(i)
+        F.write_bytes(b'x'*i)
+        out.append(str(F))
+    out.append(str(tmp_path/'missing.dat'))
+    return out
+
+
+def Parse(F, buf=None):
+    time.sleep(0.001)
+    return None if buf is None else len(buf)
+
+
+def MapWithTimeout(pool, fn, files, timeout=30):
+    """pool.map_prefetched on a thread, failing instead of hanging"""
+    result=[]
+    def Map():
+        try:
+            result.append(pool.map_prefetched(fn, files))
+        except Exception as e:
+            result.append(e)
+    thread=threading.Thread(target=Map, daemon=True)
+    thread.start()
+    thread.join(timeout)
+    if thread.is_alive():
+        # unblock the threads, so the test fails instead of hanging
+        pool._slots.release(1000)
+        pytest.fail("map_prefetched deadlocked")
+    if isinstance(result[0], Exception):
+        raise result[0]
+    return result[0]
+
+
+@pytest.mark.parametrize('readers,depth', [(1, 2), (4, 2), (8, 1), (3, 5)])
+def test_more_readers_than_slots(files, readers, depth, monkeypatch):
+    held=[0, 0]   # slots in use, maximum
+    lock=threading.Lock()
+    original=pipeline_utils.ReadBytes
+    def Read(F):
+        with lock:
+            held[0]+=1
+            held[1]=max(held)
+        time.sleep(0.002)
+        return original(F)
+    def Done(F, buf=None):
+        with lock:
+            held[0]-=1
+        return Parse(F, buf=buf)
+    monkeypatch.setattr(pipeline_utils, 'ReadBytes', Read)
+    with PipelineExecutor(max_workers=2, depth=depth, readers=readers) as pool:
+        for repeat in range(3):
+            assert MapWithTimeout(pool, Done, files)==list(range(40))+[None]
+    assert held[1]<=depth
+
+
+def test_failed_parse_frees_the_slots(files):
+    def Fail(F, buf=None):
+        if F==files[3]:
+            raise ValueError(F)
+        return Parse(F, buf=buf)
+    with PipelineExecutor(max_workers=2, depth=2, readers=4) as pool:
+        with pytest.raises(ValueError):
+            MapWithTimeout(pool, Fail, files)
+        assert MapWithTimeout(pool, Parse, files)==list(range(40))+[None]
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+
+from spec_diagnose.plot_utils import RankSubdomains
+
+
+def GhCe(maxima):
+    t=np.arange(3.)
+    return {'SD{}'.format(i): np.column_stack([t, [m-1, m, m-2]])
+            for i,m in enumerate(maxima)}
+
+
+def test_ties_at_the_boundary_keep_original_order():
+    G=GhCe([1, 3, 2, 2, 5, 2, 0])
+    legends,maxima=RankSubdomains(G, 3)
+    assert legends==['SD4', 'SD1', 'SD2']
+    np.testing.assert_array_equal(maxima, [5, 3, 2])
+    assert RankSubdomains(G, 4)[0]==['SD4', 'SD1', 'SD2', 'SD3']
+
+
+@pytest.mark.parametrize('seed', range(200))
+def test_top_N_is_prefix_of_full_ranking(seed):
+    rng=np.random.default_rng(seed)
+    G=GhCe(rng.integers(0, 4, rng.integers(1, 12)).astype(float))
+    full=RankSubdomains(G)[0]
+    for N in range(len(G)+2):
+        assert RankSubdomains(G, N)[0]==full[:N]
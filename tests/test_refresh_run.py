@@ -0,0 +1,87 @@
+import glob
+import os
+import shutil
+
+import h5py
+import numpy as np
+import pytest
+
+import spec_diagnose.segment_utils as segment_utils
+import spec_diagnose.synthetic as synthetic
+from collections.abc import Mapping
+from spec_diagnose.column_utils import RunTable
+
+
+def Plain(D):
+    """D with RunTables, LazyDats etc. turned into dictionaries of arrays"""
+    if isinstance(D, RunTable):
+        D=D.to_dict()
+    if isinstance(D, Mapping):
+        return {k: Plain(D[k]) for k in D}
+    return D
+
+
+def AssertEqual(A, B, path=''):
+    if isinstance(A, dict):
+        assert isinstance(B, dict) and sorted(A)==sorted(B), path
+        for k in A:
+            AssertEqual(A[k], B[k], path+'/'+str(k))
+    elif isinstance(A, np.ndarray):
+        np.testing.assert_array_equal(A, B, err_msg=path)
+    else:
+        assert A==B, path
+
+
+@pytest.fixture(scope='module')
+def full(tmp_path_factory):
+    """a run whose last segment restarted before the end of the previous one"""
+    root=tmp_path_factory.mktemp('full')
+    EvDir=synthetic.MakeSyntheticRun(str(root), segments=4, ringdown=0, rows=40)
+    last=os.path.join(EvDir, 'Lev2_AD', 'Run')
+    shutil.rmtree(last)
+    synthetic._MakeSegment(last, np.random.default_rng(1), 25., 40., 60, AHs='AB',
+                           nsub=28, first=False, ongoing=True, continuation=True,
+                           lmax=8, radii=(100, 200))
+    return EvDir
+
+
+def Earlier(full, EvDir):
+    """copy of the run 'full' at an earlier time: without its last segment,
+and the one before still running, with half of its output"""
+    shutil.copytree(full, EvDir)
+    shutil.rmtree(os.path.join(EvDir, 'Lev2_AD'))
+    seg=os.path.join(EvDir, 'Lev2_AC', 'Run')
+    os.remove(os.path.join(seg, 'TerminationReason.txt'))
+    for F in glob.glob(os.path.join(seg, '**', '*.dat'), recursive=True):
+        with open(F, 'rb') as f:
+            buf=f.read()
+        with open(F, 'wb') as f:
+            f.write(buf[:len(buf)//2])   # most likely within a line
+    for F in glob.glob(os.path.join(seg, '**', '*.h5'), recursive=True):
+        with h5py.File(F, 'a') as H5:
+            names=[]
+            H5.visititems(lambda name, obj: names.append(name)
+                          if isinstance(obj, h5py.Dataset) else None)
+            for name in names:
+                data,attrs=H5[name][:20],dict(H5[name].attrs)
+                del H5[name]
+                H5.create_dataset(name, data=data).attrs.update(attrs)
+
+
+@pytest.mark.parametrize('options', [{}, {'table': True}, {'lazy': True}],
+                         ids=['default', 'table', 'lazy'])
+def test_refresh_equals_fresh_import(full, tmp_path, options):
+    EvDir=str(tmp_path/'Ev')
+    Earlier(full, EvDir)
+    D=segment_utils.ImportRun(EvDir, 2, h22Finite=True, **options)
+    rows=len(Plain(D['AhA'])['ArealMass'])
+    shutil.rmtree(EvDir)
+    shutil.copytree(full, EvDir)
+    assert segment_utils.RefreshRun(D) is D
+    fresh=segment_utils.ImportRun(EvDir, 2, h22Finite=True, **options)
+    assert D['segs']==fresh['segs'] and D['termination']==fresh['termination']
+    assert len(D['AhA']['ArealMass'])>rows
+    del D['ImportInfo'], fresh['ImportInfo']
+    AssertEqual(Plain(D), Plain(fresh))
+    # stitched at the restart of the last segment
+    assert np.all(np.diff(Plain(D['AhA'])['ArealMass'][:,0])>0)
@@ -0,0 +1,35 @@
+import os
+
+import matplotlib
+matplotlib.use('Agg')
+import pytest
+
+import spec_diagnose.report as report
+import spec_diagnose.plot_utils as plot_utils
+import spec_diagnose.synthetic as synthetic
+
+
+@pytest.fixture(scope='module')
+def EvDir(tmp_path_factory):
+    return synthetic.MakeSyntheticRun(str(tmp_path_factory.mktemp('run')), segments=3,
+                                      ringdown=0, rows=50)
+
+
+def test_standard_figures(EvDir, tmp_path):
+    written=report.ReportRun(EvDir, 2, str(tmp_path))
+    names={os.path.splitext(os.path.basename(F))[0] for F in written}
+    assert 'AhA' in names and 'AhB' in names
+    assert any(name.startswith('TruncationError') for name in names)
+    assert 'Constraints' in names
+
+
+def test_failed_figure_fails_the_run(EvDir, tmp_path, monkeypatch):
+    def broken(*args, **kwargs):
+        raise AttributeError('broken')
+    monkeypatch.setattr(plot_utils, 'PlotAH', broken)
+    with pytest.raises(report.FigureError) as e:
+        report.ReportRun(EvDir, 2, str(tmp_path))
+    assert [name for name,msg in e.value.failed]==['AhA', 'AhB', 'AhC']
+    assert any(F.endswith('Constraints.png') for F in e.value.written)
+    written,error=report._ReportJob(EvDir, 2, str(tmp_path), {})
+    assert error is not None and 'AhA' in error
@@ -0,0 +1,100 @@
+import os
+
+import h5py
+import numpy as np
+import pytest
+
+import spec_diagnose.segment_utils as segment_utils
+import spec_diagnose.synthetic as synthetic
+from spec_diagnose.plot_utils import RankSubdomains
+from spec_diagnose.stream_utils import Reduce, DecimatedSamples, RunningMinMax
+
+
+@pytest.fixture(scope='module')
+def run(tmp_path_factory):
+    """a run whose ringdown segments overlap the end of the inspiral"""
+    EvDir=synthetic.MakeSyntheticRun(str(tmp_path_factory.mktemp('run')), segments=4,
+                                     ringdown=2, rows=40)
+    segs,tstart,term=segment_utils.FindLatestSegments(EvDir, 2)
+    return EvDir, segs, tstart
+
+
+def Concatenate(it):
+    """concatenate the per-segment dictionaries of a stream"""
+    out={}
+    for seg,t,D in it:
+        segment_utils._MergeSegment(out, D)
+    return segment_utils._Materialize(out)
+
+
+def AssertEqual(A, B):
+    assert A.keys()==B.keys()
+    for k in A:
+        if isinstance(A[k], dict):
+            AssertEqual(A[k], B[k])
+        else:
+            np.testing.assert_array_equal(A[k], B[k])
+
+
+def test_dat_stream_matches_import(run):
+    EvDir,segs,tstart=run
+    D=segment_utils.ImportRun(EvDir, 2)
+    S=Concatenate(segment_utils.IterDat_from_segments(segs, 'TStepperDiag.dat', tstart))
+    AssertEqual(S, D['TStepperDiag'])
+    assert np.all(np.diff(S['dt'][:,0])>0)
+    # the segments do overlap, without stitching the stream has more rows
+    U=Concatenate(segment_utils.IterDat_from_segments(segs, 'TStepperDiag.dat', tstart,
+                                                      stitch=False))
+    assert len(U['dt'])>len(S['dt'])
+
+
+@pytest.fixture
+def h5segs(tmp_path):
+    """segments of an h5 file, restarted before the end of the previous ones;
+data-set 'b' is missing in the second segment"""
+    segs=[]
+    for i,(t0,t1) in enumerate([(0, 12), (10, 22), (5, 30), (28, 40)]):
+        seg=str(tmp_path/'seg{}'.format(i))
+        os.makedirs(seg)
+        t=np.arange(t0, t1, 1.)
+        with h5py.File(os.path.join(seg, 'test.h5'), 'w') as F:
+            g=F.create_group('A.dir')
+            synthetic._WriteH5Dat(g, 'a.dat', t, ['x', 'y'], np.column_stack([t+i, -t]))
+            if i!=1:
+                F.create_dataset('b.dat', data=np.column_stack([t[::2], t[::2]*i]))
+        segs.append(seg)
+    return segs
+
+
+def test_h5_stream_matches_loader(h5segs):
+    for options in {}, {'tmin': 3., 'tmax': 33.}:
+        D=segment_utils.LoadH5_from_segments(h5segs, 'test.h5', **options)
+        S=Concatenate(segment_utils.IterH5_from_segments(h5segs, 'test.h5',
+                                                         tstart=[0]*4, **options))
+        AssertEqual(S, D)
+        assert np.all(np.diff(S['A']['a']['x'][:,0])>0) and np.all(np.diff(S['b'][:,0])>0)
+    U=Concatenate(segment_utils.IterH5_from_segments(h5segs, 'test.h5', tstart=[0]*4,
+                                                     stitch=False))
+    AssertEqual(U, segment_utils.LoadH5_from_segments(h5segs, 'test.h5', stitch=False))
+
+
+def test_decimated_samples(run):
+    EvDir,segs,tstart=run
+    D=segment_utils.ImportRun(EvDir, 2)
+    samples,=Reduce(segment_utils.IterDat_from_segments(segs, 'TStepperDiag.dat', tstart),
+                    DecimatedSamples(7))
+    for legend in D['TStepperDiag']:
+        np.testing.assert_array_equal(samples[legend], D['TStepperDiag'][legend][::7])
+
+
+def test_running_min_max_ignores_all_nan_segments():
+    nan=np.nan
+    segments=[{'a': np.array([[0, nan], [1, nan]]), 'b': np.array([[0, 1.], [1, 2]])},
+              {'a': np.array([[2, 5.], [3, 7]]), 'b': np.array([[2, nan], [3, nan]])}]
+    for order in segments, segments[::-1]:
+        MinMax,=Reduce(((None, None, D) for D in order), RunningMinMax())
+        assert MinMax=={'a': (5, 7), 'b': (1, 2)}
+    legends,maxima=RankSubdomains((None, None, D) for D in segments)
+    assert legends==['a', 'b'] and list(maxima)==[7, 2]
+    MinMax,=Reduce([(None, None, {'a': np.array([[0, nan]])})], RunningMinMax())
+    assert np.isnan(MinMax['a']).all()